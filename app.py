@@ -5,32 +5,135 @@ Shipping Data API
 Flask API for managing shipping data with comprehensive endpoints
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from flask_caching import Cache
+from flask_compress import Compress
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
+from psycopg2 import sql
 import os
 import json
-from datetime import datetime, timedelta
+import base64
+import atexit
+import threading
+import queue
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from dateutil import parser
-import pandas as pd
 import re
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase import pdfmetrics
 import tempfile
+import time
+import mimetypes
+import csv
 import uuid
+import hashlib
+import itertools
+
+# Optional fast JSON serialization (falls back to Flask's stdlib json provider)
+try:
+    import orjson
+    _ORJSON_AVAILABLE = True
+except Exception:
+    _ORJSON_AVAILABLE = False
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson.
+
+    Dates and Decimals are passed through to Flask's default handler so
+    responses keep the same format as the stdlib provider.
+    """
+    @property
+    def option(self):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        # Flask's provider sorts keys by default (sort_keys = True)
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes to the response as-is (no str decode/re-encode)
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self.option | orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option), mimetype=self.mimetype
+        )
+
+def _dumps_jsonb(obj):
+    return orjson.dumps(obj).decode('utf-8') if _ORJSON_AVAILABLE else json.dumps(obj)
+
+def to_jsonb(obj):
+    """Wrap obj for binding to a JSONB column parameter"""
+    return psycopg2.extras.Json(obj, dumps=_dumps_jsonb)
+
+# Decode JSONB result columns with orjson as well
+if _ORJSON_AVAILABLE:
+    psycopg2.extras.register_default_jsonb(globally=True, loads=orjson.loads)
 
 app = Flask(__name__)
+if _ORJSON_AVAILABLE:
+    app.json = ORJSONProvider(app)
 CORS(app, origins=['*'], methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
 
+# Compress JSON responses (brotli when the client accepts it, else gzip)
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_LEVEL'] = 4
+app.config['COMPRESS_BR_LEVEL'] = 4
+app.config['COMPRESS_MIN_SIZE'] = 1024
+Compress(app)
+
+# Hand export downloads to the reverse proxy (nginx X-Accel-Redirect) instead of
+# streaming them through the worker. X_ACCEL_PREFIX must be an nginx `internal`
+# location aliased to EXPORT_DIR.
+app.config['USE_X_ACCEL'] = os.getenv('USE_X_ACCEL', '').lower() in ('1', 'true', 'yes')
+app.config['X_ACCEL_PREFIX'] = os.getenv('X_ACCEL_PREFIX', '/internal-exports/')
+# Apache/lighttpd equivalent: send_file answers with an X-Sendfile header
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+# Response cache for the aggregate endpoints. Shared through Redis when
+# REDIS_URL is set, otherwise kept per worker process.
+CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', 120))
+# Staggered by freshness tolerance: the all-time top customers come from an
+# hourly-refreshed view, while the total count is expected to move quickly
+TOP_CUSTOMERS_CACHE_TIMEOUT = int(os.getenv('TOP_CUSTOMERS_CACHE_TIMEOUT', 300))
+TOTAL_CACHE_TIMEOUT = int(os.getenv('TOTAL_CACHE_TIMEOUT', 30))
+if os.getenv('REDIS_URL'):
+    cache = Cache(app, config={'CACHE_TYPE': 'RedisCache',
+                               'CACHE_REDIS_URL': os.getenv('REDIS_URL'),
+                               'CACHE_DEFAULT_TIMEOUT': CACHE_TIMEOUT})
+else:
+    cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache',
+                               'CACHE_DEFAULT_TIMEOUT': CACHE_TIMEOUT})
+
+def is_cacheable_response(rv):
+    """Only cache successful responses (errors are returned as (response, status) tuples)"""
+    return not isinstance(rv, tuple)
+
 # Table creation is now handled in start_api.py during database initialization
 
 # Database configuration
-from database_config import DB_CONFIG
+from database_config import DB_CONFIG, DB_POOL_MIN, DB_POOL_MAX
 
 # Optional Arabic shaping/bidi dependencies (used if available)
 try:
@@ -121,244 +224,708 @@ def register_arabic_font():
     _ARABIC_FONT_NAME = 'Helvetica'
     return _ARABIC_FONT_NAME
 
+# Shared ReportLab styles for PDF exports
+_PDF_STYLES = getSampleStyleSheet()
+_PDF_TABLE_STYLE = None
+
+def get_pdf_table_style():
+    """Return the export table style, built once the Arabic font is registered"""
+    global _PDF_TABLE_STYLE
+    if _PDF_TABLE_STYLE is None:
+        arabic_font = register_arabic_font()
+        _PDF_TABLE_STYLE = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), _ARABIC_FONT_BOLD_NAME or arabic_font),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
+        ])
+    return _PDF_TABLE_STYLE
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers which statements it has PREPAREd"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+# A psycopg2 placeholder: %% (literal %), %s, %(name)s or a stray %
+_PLACEHOLDER_RE = re.compile(r'%(\([^)]*\))?(.?)', re.DOTALL)
+
+def number_placeholders(query, param_count):
+    """Rewrite psycopg2 %s placeholders as PREPARE's positional $1, $2, ...
+
+    Follows psycopg2's own formatting: %% becomes a literal %, and a query
+    run without parameters is left untouched. Named %(name)s placeholders
+    aren't supported, and the number of %s must match param_count.
+    """
+    if not param_count:
+        return query
+    
+    counter = itertools.count(1)
+    
+    def replace(match):
+        name, char = match.groups()
+        if name is None and char == '%':
+            return '%'
+        if name is None and char == 's':
+            return f"${next(counter)}"
+        raise ValueError(f"Unsupported placeholder {match.group(0)!r} in prepared query")
+    
+    numbered = _PLACEHOLDER_RE.sub(replace, query)
+    placeholder_count = next(counter) - 1
+    if placeholder_count != param_count:
+        raise ValueError(
+            f"Prepared query has {placeholder_count} placeholders but {param_count} parameters"
+        )
+    return numbered
+
 class DatabaseManager:
     """Database connection and query manager for PostgreSQL"""
     
-    def __init__(self, config=DB_CONFIG):
+    def __init__(self, config=DB_CONFIG, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX):
         self.config = config
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # psycopg2's pool raises when exhausted; wait for a free slot instead
+        self._slots = threading.BoundedSemaphore(maxconn)
+    
+    def get_pool(self):
+        """Get the shared connection pool, creating it on first use"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(
+                        self.minconn, self.maxconn,
+                        connection_factory=PooledConnection, **self.config
+                    )
+                    atexit.register(self.close_pool)
+        return self._pool
+    
+    def close_pool(self):
+        """Close every pooled connection"""
+        if self._pool is not None and not self._pool.closed:
+            self._pool.closeall()
     
     def get_connection(self):
-        """Get database connection"""
-        return psycopg2.connect(**self.config)
+        """Get database connection from the pool, waiting for a free slot"""
+        self._slots.acquire()
+        try:
+            return self.get_pool().getconn()
+        except Exception:
+            self._slots.release()
+            raise
     
-    def execute_query(self, query, params=None):
-        """Execute query and return results"""
+    def release(self, conn, close=False):
+        """Return a connection to the pool (close=True discards it)"""
+        try:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.putconn(conn, close=close)
+            else:
+                conn.close()
+        finally:
+            self._slots.release()
+    
+    @contextmanager
+    def connection(self, autocommit=True):
+        """Borrow a pooled connection, discarding it if it turned out to be broken
+
+        Single statements run in autocommit mode: psycopg2 otherwise sends a
+        BEGIN before the statement and the pool a ROLLBACK on release, three
+        round-trips instead of one. Pass autocommit=False for work that needs
+        a transaction; it is rolled back on release unless committed.
+        """
         conn = self.get_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
+        if conn.autocommit != autocommit:
+            conn.autocommit = autocommit
+        broken = False
         try:
-            # Convert SQLite placeholders to PostgreSQL placeholders
-            query = convert_sqlite_to_postgresql(query)
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, close=broken or bool(conn.closed))
+    
+    def execute_query(self, query, params=None):
+        """Execute query and return results"""
+        with self.connection() as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
             
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                
+                # RealDictRow is already a dict, no need to copy each row
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+    
+    def execute_prepared(self, query, params=None):
+        """Execute query as a server-side prepared statement and return results
+
+        The statement is PREPAREd once per pooled connection, named after a hash
+        of the query text, and EXECUTEd after that, so PostgreSQL skips parsing
+        and planning on repeat calls. Only use for a bounded set of query texts.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
             
-            # Fetch all results
-            results = cursor.fetchall()
+            try:
+                self._execute_prepared(conn, cursor, query, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+    
+    def _execute_prepared(self, conn, cursor, query, params):
+        """PREPARE query on conn if needed, then EXECUTE it on cursor"""
+        name = "stmt_" + hashlib.md5(query.encode('utf-8')).hexdigest()[:16]
+        params = list(params or [])
+        
+        if name not in conn.prepared_statements:
+            # PREPARE takes positional $n placeholders
+            numbered = number_placeholders(query, len(params))
+            cursor.execute(f"PREPARE {name} AS {numbered}")
+            conn.prepared_statements.add(name)
+        
+        if params:
+            placeholders = ", ".join(["%s"] * len(params))
+            cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+    
+    def iter_copy_csv(self, query, params=None, chunk_size=65536, queue_size=16):
+        """Yield the results of query as CSV (with a header row), as COPY produces it
+
+        PostgreSQL formats the rows; COPY runs on a worker thread and hands its
+        output over in chunk_size blocks through a bounded queue, so the first
+        bytes can be sent while the rest is still being produced, with no row
+        objects built in Python. Closing the generator early (e.g. the client
+        disconnected) cancels the COPY and releases the pooled connection.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            chunks = queue.Queue(maxsize=queue_size)
+            cancelled = threading.Event()
+            finished = object()
             
-            # Convert to list of dictionaries
-            data = []
-            for row in results:
-                data.append(dict(row))
+            def put(item):
+                # Give up once the consumer is gone rather than block forever
+                while not cancelled.is_set():
+                    try:
+                        chunks.put(item, timeout=1)
+                        return
+                    except queue.Full:
+                        continue
             
-            return data
-        finally:
-            cursor.close()
-            conn.close()
+            class Pipe:
+                """File-like target for copy_expert, batching rows into chunks"""
+                def __init__(self):
+                    self.parts = []
+                    self.size = 0
+                
+                def write(self, data):
+                    self.parts.append(data)
+                    self.size += len(data)
+                    if self.size >= chunk_size:
+                        self.flush()
+                
+                def flush(self):
+                    if self.parts:
+                        put(b''.join(self.parts))
+                        self.parts, self.size = [], 0
+            
+            def copy():
+                pipe = Pipe()
+                try:
+                    # COPY can't take bind parameters, so inline them safely first
+                    copy_sql = cursor.mogrify(query, params or None).decode('utf-8')
+                    cursor.copy_expert(f"COPY ({copy_sql}) TO STDOUT WITH (FORMAT csv, HEADER)", pipe)
+                    pipe.flush()
+                    put(finished)
+                except Exception as e:
+                    put(e)
+            
+            worker = threading.Thread(target=copy, name='copy-csv', daemon=True)
+            worker.start()
+            try:
+                while True:
+                    item = chunks.get()
+                    if item is finished:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                if worker.is_alive():
+                    cancelled.set()
+                    conn.cancel()
+                    worker.join()
+                cursor.close()
+    
+    def mogrify(self, query, params=None):
+        """Return query (a string or psycopg2.sql Composable) with params bound, as SQL text"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            try:
+                return cursor.mogrify(query, params or None).decode('utf-8')
+            finally:
+                cursor.close()
     
     def execute_raw_query(self, query):
         """Execute raw SQL query without any conversion (for custom reports)"""
-        conn = self.get_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        try:
-            # Execute the query directly without any conversion
-            cursor.execute(query)
+        # User-supplied SQL: never committed, rolled back when the connection is released
+        with self.connection(autocommit=False) as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
             
-            # Fetch all results
-            results = cursor.fetchall()
-            
-            # Convert to list of dictionaries
-            data = []
-            for row in results:
-                data.append(dict(row))
+            try:
+                # Execute the query directly without any conversion
+                cursor.execute(query)
+                
+                # RealDictRow is already a dict, no need to copy each row
+                return cursor.fetchall()
+            except Exception as e:
+                print(f"SQL Error: {str(e)}")  # Debug log
+                raise e
+            finally:
+                cursor.close()
+    
+    def execute_insert(self, query, params=None, prepared=False):
+        """Execute insert/update/delete query
+
+        With prepared=True the statement goes through a per-connection
+        prepared statement (see execute_prepared); use it for hot, fixed
+        query texts.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
             
-            return data
-        except Exception as e:
-            print(f"SQL Error: {str(e)}")  # Debug log
-            raise e
-        finally:
-            cursor.close()
-            conn.close()
+            try:
+                if prepared:
+                    self._execute_prepared(conn, cursor, query, params)
+                elif params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                
+                # Runs in autocommit mode, so the statement is already committed
+                # For PostgreSQL, we need to get the last inserted ID differently
+                if 'RETURNING' in query.upper():
+                    result = cursor.fetchone()
+                    return result[0] if result else None
+                else:
+                    return cursor.rowcount
+            finally:
+                cursor.close()
     
-    def execute_insert(self, query, params=None):
-        """Execute insert/update/delete query"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def execute_many(self, query, seq_of_params, page_size=1000):
+        """Execute a multi-row insert/update in batches and return the affected row count
+
+        query must contain a single "VALUES %s", which is expanded to up to
+        page_size rows per statement (psycopg2.extras.execute_values), so a
+        batch costs one round-trip per page instead of one per row. Everything
+        is committed together. Use execute_insert for single rows / RETURNING.
+        """
+        seq_of_params = list(seq_of_params)
         
-        try:
-            # Convert SQLite placeholders to PostgreSQL placeholders
-            query = convert_sqlite_to_postgresql(query)
-            
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+        with self.connection(autocommit=False) as conn:
+            cursor = conn.cursor()
             
-            conn.commit()
-            # For PostgreSQL, we need to get the last inserted ID differently
-            if 'RETURNING' in query.upper():
-                result = cursor.fetchone()
-                return result[0] if result else None
-            else:
-                return cursor.rowcount
-        finally:
-            cursor.close()
-            conn.close()
+            try:
+                rowcount = 0
+                for start in range(0, len(seq_of_params), page_size):
+                    page = seq_of_params[start:start + page_size]
+                    psycopg2.extras.execute_values(cursor, query, page, page_size=page_size)
+                    rowcount += cursor.rowcount
+                
+                conn.commit()
+                return rowcount
+            finally:
+                cursor.close()
 
 # Initialize database manager
 db = DatabaseManager()
 
 # Table creation moved to start_api.py
 
+# DD-MMM-YY shipment creation dates, e.g. 05-Jan-25
+_DATE_RE = re.compile(r'^(\d{2})-(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)-(\d{2})$')
+_MONTHS = {month: f'{i + 1:02d}' for i, month in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+)}
+
 def convert_date_to_comparable(date_str):
     """Convert DD-MMM-YY format to YYYYMMDD for comparison"""
-    try:
-        if not date_str or len(date_str) != 9:
-            return None
-        
-        day = date_str[:2]
-        month_str = date_str[3:6]
-        year = date_str[7:9]
-        
-        month_map = {
-            'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04',
-            'May': '05', 'Jun': '06', 'Jul': '07', 'Aug': '08',
-            'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'
-        }
-        
-        month = month_map.get(month_str)
-        if not month:
-            return None
-        
-        # Convert 2-digit year to 4-digit (assuming 20xx)
-        full_year = '20' + year
-        
-        return f"{full_year}{month}{day}"
-    except:
+    match = _DATE_RE.match(date_str or '')
+    if not match:
         return None
+    
+    # Convert 2-digit year to 4-digit (assuming 20xx)
+    return f"20{match[3]}{_MONTHS[match[2]]}{match[1]}"
+
+# Relative date_filter presets: name -> days before today (inclusive)
+DATE_FILTER_PRESETS = {'today': 0, 'week': 7, 'month': 30, 'year': 365}
+
+# Explicit date formats tried before falling back to dateutil
+DATE_FILTER_FORMATS = ('%Y-%m-%d', '%d-%b-%y')
+
+@functools.lru_cache(maxsize=1024)
+def _parse_date_filter(date_str, today_ordinal):
+    """Cached worker for parse_date_filter, keyed by the current day"""
+    key = date_str.lower()
+    if key == 'total':
+        # Return None for total to show all records
+        return None, None
+    
+    if key in DATE_FILTER_PRESETS:
+        end_date = date.fromordinal(today_ordinal)
+        return end_date - timedelta(days=DATE_FILTER_PRESETS[key]), end_date
+    
+    # Try to parse as specific date
+    for fmt in DATE_FILTER_FORMATS:
+        try:
+            start_date = datetime.strptime(date_str, fmt).date()
+            break
+        except ValueError:
+            continue
+    else:
+        start_date = parser.parse(date_str).date()
+    return start_date, start_date + timedelta(days=1)
+
+# Wall clock shared by requests within the same second: (time.time(), datetime)
+_CLOCK = [0.0, None]
+
+def now_cached():
+    """datetime.now(), refreshed at most once per second"""
+    t = time.time()
+    if t - _CLOCK[0] >= 1.0:
+        _CLOCK[:] = [t, datetime.now()]
+    return _CLOCK[1]
 
 def parse_date_filter(date_str):
-    """Parse date string and return start and end dates in comparable format (YYYYMMDD)"""
+    """Parse date string and return start and end dates (datetime.date, inclusive)"""
     if not date_str:
         return None, None
     
     try:
-        if date_str.lower() == 'today':
-            end_date = datetime.now()
-            start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif date_str.lower() == 'week':
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=7)
-        elif date_str.lower() == 'month':
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=30)
-        elif date_str.lower() == 'year':
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=365)
-        elif date_str.lower() == 'total':
-            # Return None for total to show all records
-            return None, None
-        else:
-            # Try to parse as specific date
-            parsed_date = parser.parse(date_str)
-            start_date = parsed_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = start_date + timedelta(days=1)
-        
-        # Convert to comparable format (YYYYMMDD)
-        start_formatted = start_date.strftime('%Y%m%d')
-        end_formatted = end_date.strftime('%Y%m%d')
-        
-        return start_formatted, end_formatted
+        # Compared against the DATE column returned by get_date_filter_sql()
+        return _parse_date_filter(date_str, now_cached().toordinal())
     except:
         return None, None
 
 def get_date_filter_sql():
-    """Get the SQL CASE statement for date filtering (PostgreSQL compatible)"""
-    return """CASE 
-        WHEN shipment_creation_date LIKE '__-___-__' THEN
-            '20' || substring(shipment_creation_date, 8, 2) || 
-            CASE substring(shipment_creation_date, 4, 3)
-                WHEN 'Jan' THEN '01'
-                WHEN 'Feb' THEN '02'
-                WHEN 'Mar' THEN '03'
-                WHEN 'Apr' THEN '04'
-                WHEN 'May' THEN '05'
-                WHEN 'Jun' THEN '06'
-                WHEN 'Jul' THEN '07'
-                WHEN 'Aug' THEN '08'
-                WHEN 'Sep' THEN '09'
-                WHEN 'Oct' THEN '10'
-                WHEN 'Nov' THEN '11'
-                WHEN 'Dec' THEN '12'
-            END ||
-            substring(shipment_creation_date, 1, 2)
-        ELSE shipment_creation_date
-    END"""
-
-def convert_sqlite_to_postgresql(query):
-    """Convert SQLite placeholders (?) to PostgreSQL placeholders (%s)"""
-    return query.replace('?', '%s')
+    """Get the SQL expression for the shipment creation date (PostgreSQL compatible)
+
+    shipment_creation_date_parsed is a stored DATE column generated from the
+    DD-MMM-YY text column (see start_api.py), so it can be indexed.
+    """
+    return "shipment_creation_date_parsed"
+
+# Bound once at import; handlers interpolate this constant into their SQL
+DATE_SQL = get_date_filter_sql()
+
+# Newest first; matches the (date DESC NULLS LAST, id DESC) index, with id
+# as a tiebreaker so LIMIT/OFFSET and cursor pages are deterministic
+DATE_ORDER_SQL = f"{DATE_SQL} DESC NULLS LAST, id DESC"
+
+# Filtered result sets estimated above this many rows report the planner's
+# estimate instead of running an exact COUNT(*)
+COUNT_ESTIMATE_THRESHOLD = 100000
+
+def _text_filter(column, term):
+    """Return (sql, param) matching term against a shipments text column
+
+    Descriptions use full-text search (word match, GIN expression index);
+    other columns use a case-insensitive substring ILIKE, served by the
+    pg_trgm GIN indexes created in start_api.py.
+    """
+    if column == 'shipment_description':
+        return "to_tsvector('simple', shipment_description) @@ plainto_tsquery('simple', %s)", term
+    return f"{column} ILIKE %s", f'%{term}%'
+
+# Columns /api/shipments/filter may search (the column name is interpolated into SQL)
+FILTER_COLUMNS = frozenset({
+    'number_shipment', 'country_code',
+    'shipper_city', 'shipper_phone', 'shipper_name', 'shipper_address',
+    'consignee_city', 'consignee_phone', 'consignee_name', 'consignee_address',
+    'shipment_reference_number', 'shipment_creation_date', 'cod',
+    'shipment_weight', 'number_of_shipment_boxes', 'shipment_description',
+    'pdf_filename', 'processing_date',
+})
+
+# Columns returned by the shipment list endpoints: every column except the
+# search_text tsvector, which only backs /api/shipments/search
+SHIPMENT_COLUMNS = (
+    'id', 'number_shipment', 'country_code',
+    'shipper_city', 'shipper_phone', 'shipper_name', 'shipper_address',
+    'consignee_city', 'consignee_phone', 'consignee_name', 'consignee_address',
+    'shipment_reference_number', 'shipment_creation_date', 'cod',
+    'shipment_weight', 'number_of_shipment_boxes', 'shipment_description',
+    'pdf_filename', 'processing_date', 'created_at',
+    'shipment_creation_date_parsed', 'shipment_weight_num', 'cod_num',
+)
+SHIPMENT_COLUMNS_SQL = ", ".join(SHIPMENT_COLUMNS)
+
+def estimate_shipments_count(where_clause="", params=None):
+    """Return an estimated count of shipments matching where_clause, or None
+
+    Unfiltered totals come from pg_class.reltuples (kept up to date by
+    autovacuum/ANALYZE). Filtered totals use the planner's row estimate when
+    it is large. None means an exact count is cheap enough to run instead.
+    """
+    if not where_clause:
+        result = db.execute_prepared(
+            "SELECT reltuples::bigint as total FROM pg_class WHERE oid = 'shipments'::regclass"
+        )
+        # reltuples is -1 until the table has been analyzed
+        if result and result[0]['total'] >= 0:
+            return result[0]['total']
+        return None
+    
+    plan = db.execute_query(
+        "EXPLAIN (FORMAT JSON) SELECT 1 FROM shipments" + where_clause, params
+    )[0]['QUERY PLAN']
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    return estimate if estimate > COUNT_ESTIMATE_THRESHOLD else None
+
+# Exact counts of at least COUNT_CACHE_MIN rows are cached for COUNT_CACHE_TIMEOUT
+# seconds, so paging through the same filter doesn't recount on every page
+COUNT_CACHE_TIMEOUT = 60
+COUNT_CACHE_MIN = 1000
+
+def _count_cache_key(where_clause, params):
+    """Cache key for the count of shipments matching where_clause/params"""
+    digest = hashlib.blake2b(
+        (where_clause + repr(list(params or []))).encode('utf-8'), digest_size=16
+    ).hexdigest()
+    return f"shipments_count:{digest}"
+
+def cache_count(where_clause, params, total):
+    """Remember an exact count if it was expensive enough to be worth caching"""
+    if total >= COUNT_CACHE_MIN:
+        cache.set(_count_cache_key(where_clause, params), total, timeout=COUNT_CACHE_TIMEOUT)
+
+def count_shipments(where_clause="", params=None, exact=False):
+    """Return (total, approximate) for shipments matching where_clause
+
+    exact=True skips the estimate and always counts.
+    """
+    total = None if exact else estimate_shipments_count(where_clause, params)
+    if total is not None:
+        return total, True
+    
+    total = cache.get(_count_cache_key(where_clause, params))
+    if total is None:
+        count_query = f"SELECT COUNT(*) as total FROM shipments{where_clause}"
+        total = db.execute_query(count_query, params)[0]['total']
+        cache_count(where_clause, params, total)
+    return total, False
+
+# Rows (by id) scanned by the sampled "recent" queries for each date_filter preset
+ID_SAMPLE_SIZES = {'today': 24000, 'week': 168000, 'month': 720000, 'year': 8640000}
+ID_SAMPLE_DEFAULT = 720000
+
+# MAX(id) is re-read at most every MAX_ID_CACHE_TIMEOUT seconds; ids only grow,
+# so a slightly stale value just widens the sample by the rows added since
+MAX_ID_CACHE_TIMEOUT = 15
+_MAX_ID = [0.0, 0]
+
+def sample_id_floor(date_filter):
+    """Lower id bound of the id-sampled window for date_filter"""
+    t = time.time()
+    if t - _MAX_ID[0] >= MAX_ID_CACHE_TIMEOUT:
+        max_id = db.execute_query("SELECT MAX(id) as max_id FROM shipments")[0]['max_id']
+        _MAX_ID[:] = [t, max_id or 0]
+    return _MAX_ID[1] - ID_SAMPLE_SIZES.get(date_filter, ID_SAMPLE_DEFAULT)
+
+def fetch_shipments_page(where_clause, params, order_by, limit, offset, prepared=False):
+    """Fetch one page of shipments and the exact total in a single query
+
+    Returns (rows, total). The total comes from a scalar COUNT(*) subquery
+    (or the count cache), so it is only run separately when the page is past
+    the end of the result set. prepared=True runs the page query through
+    db.execute_prepared.
+    """
+    execute = db.execute_prepared if prepared else db.execute_query
+    
+    cached_total = cache.get(_count_cache_key(where_clause, params))
+    if cached_total is not None:
+        query = f"SELECT {SHIPMENT_COLUMNS_SQL} FROM shipments{where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
+        return execute(query, list(params) + [limit, offset]), cached_total
+    
+    # The subquery runs once (InitPlan), so unlike COUNT(*) OVER() the page
+    # itself can stop after LIMIT rows of the ordered index scan
+    query = (f"SELECT {SHIPMENT_COLUMNS_SQL}, (SELECT COUNT(*) FROM shipments{where_clause}) as _total "
+             f"FROM shipments{where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s")
+    rows = execute(query, list(params) * 2 + [limit, offset])
+    
+    if rows:
+        total = rows[0]['_total']
+        for row in rows:
+            row.pop('_total', None)
+    elif offset:
+        count_query = f"SELECT COUNT(*) as total FROM shipments{where_clause}"
+        total = db.execute_query(count_query, params)[0]['total']
+    else:
+        total = 0
+    
+    cache_count(where_clause, params, total)
+    return rows, total
+
+def encode_cursor(row, by_date=True):
+    """Build the opaque keyset pagination cursor for the last row of a page"""
+    values = [row['id']]
+    if by_date:
+        last_date = row['shipment_creation_date_parsed']
+        values.insert(0, last_date.isoformat() if last_date else None)
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def get_seek_condition(cursor, by_date=True):
+    """Return (sql, params) selecting the rows that follow an encode_cursor() cursor
+
+    Matches ORDER BY id DESC, or ORDER BY <date> DESC NULLS LAST, id DESC
+    when by_date is set. Raises ValueError for a malformed cursor.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not by_date:
+            (last_id,) = values
+            return "id < %s", [int(last_id)]
+        last_date, last_id = values
+        last_id = int(last_id)
+        if last_date is not None:
+            last_date = date.fromisoformat(last_date)
+    except (TypeError, UnicodeError) as e:
+        raise ValueError(str(e))
+    
+    if last_date is None:
+        # Already inside the trailing NULL dates
+        return f"({DATE_SQL} IS NULL AND id < %s)", [last_id]
+    return f"(({DATE_SQL}, id) < (%s, %s) OR {DATE_SQL} IS NULL)", [last_date, last_id]
+
+def fetch_shipments_after(where_clause, params, cursor, limit, by_date=True, prepared=False):
+    """Fetch the page of shipments following a keyset cursor
+
+    Returns (rows, next_cursor); next_cursor is None on the last page. Cost
+    is bounded by limit however deep the page is, unlike OFFSET.
+    prepared=True runs the query through db.execute_prepared.
+    """
+    seek_sql, seek_params = get_seek_condition(cursor, by_date)
+    where_clause = (where_clause + " AND " if where_clause else " WHERE ") + seek_sql
+    if by_date:
+        order_by = DATE_ORDER_SQL
+    else:
+        order_by = "id DESC"
+    
+    # Fetch one extra row to know whether there is a next page
+    query = f"SELECT {SHIPMENT_COLUMNS_SQL} FROM shipments{where_clause} ORDER BY {order_by} LIMIT %s"
+    execute = db.execute_prepared if prepared else db.execute_query
+    rows = execute(query, list(params) + seek_params + [limit + 1])
+    
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1], by_date)
+    return rows, None
+
+def fetch_city_counts(start_date, end_date, limit):
+    """Top consignee cities by shipment count, all-time when no date range is given
+
+    Sums the per-day counts precomputed in mv_city_daily_counts (see
+    start_api.py; refreshed with `python start_api.py --refresh-views`).
+    """
+    date_where = ""
+    params = []
+    if start_date and end_date:
+        date_where = "WHERE shipment_date >= %s AND shipment_date <= %s"
+        params.extend([start_date, end_date])
+    
+    query = f"""
+    SELECT 
+        city,
+        SUM(shipment_count)::BIGINT as shipment_count
+    FROM mv_city_daily_counts
+    {date_where}
+    GROUP BY city 
+    ORDER BY shipment_count DESC 
+    LIMIT %s
+    """
+    params.append(limit)
+    
+    return db.execute_prepared(query, params)
 
 def get_weight_parsing_sql():
-    """Get SQL for parsing weight values to numeric format"""
-    return """
-    CASE 
-        WHEN shipment_weight IS NULL OR shipment_weight = '' THEN NULL
-        ELSE 
-            CAST(
-                REGEXP_REPLACE(
-                    REGEXP_REPLACE(
-                        REGEXP_REPLACE(
-                            TRIM(shipment_weight), 
-                            '[^0-9.]', '', 'g'
-                        ),
-                        '^[.]', '0.', 'g'
-                    ),
-                    '[.]$', '', 'g'
-                ) AS NUMERIC
-            )
-    END
+    """Get SQL for the numeric shipment weight
+
+    shipment_weight_num is a stored generated NUMERIC column parsed from the
+    shipment_weight text (see start_api.py), so it can be indexed.
     """
+    return "shipment_weight_num"
+
+# Bound once at import, like DATE_SQL
+WEIGHT_SQL = get_weight_parsing_sql()
 
 def get_cod_parsing_sql():
-    """Get SQL for parsing COD values to numeric format (strip non-digits)"""
-    return """
-    CASE 
-        WHEN cod IS NULL OR cod = '' THEN NULL
-        ELSE 
-            CAST(
-                REGEXP_REPLACE(
-                    REGEXP_REPLACE(
-                        REGEXP_REPLACE(
-                            TRIM(cod), 
-                            '[^0-9.]', '', 'g'
-                        ),
-                        '^[.]', '0.', 'g'
-                    ),
-                    '[.]$', '', 'g'
-                ) AS NUMERIC
-            )
-    END
+    """Get SQL for the numeric COD amount
+
+    cod_num is a stored generated NUMERIC column parsed from the cod text
+    (see start_api.py), so the digits-only cleanup runs once per row write.
     """
+    return "cod_num"
 
-def normalize_iso_to_yyyymmdd(date_str):
-    """Normalize ISO date YYYY-MM-DD to YYYYMMDD for varchar date comparisons"""
-    try:
-        if not date_str:
-            return None
-        return date_str.replace('-', '')
-    except Exception:
+# Bound once at import, like DATE_SQL
+COD_SQL = get_cod_parsing_sql()
+
+# Upper bound for ?limit= on list endpoints (full result sets: /api/export/stream)
+MAX_LIMIT = int(os.getenv('MAX_LIMIT', 10000))
+
+def get_limit_param(default):
+    """Read the ?limit= request parameter, clamped to 1..MAX_LIMIT"""
+    return max(1, min(int(request.args.get('limit', default)), MAX_LIMIT))
+
+def get_bool_param(name, default=False):
+    """Read a boolean request parameter (1/true/yes/on, case-insensitive)"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+@functools.lru_cache(maxsize=1024)
+def parse_date_param(date_str):
+    """Parse a YYYY-MM-DD (or YYYYMMDD) request parameter into a date"""
+    if not date_str:
         return None
+    for fmt in ('%Y-%m-%d', '%Y%m%d'):
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+# Bidi control marks stripped from PDF text (they render as squares)
+_BIDI_MARKS_TABLE = str.maketrans('', '', '\u200f\u200e\u202a\u202b\u202c\u202d\u202e')
+
+# Arabic Presentation Forms-A/-B: text containing these is already shaped
+_ARABIC_PRESENTATION_FORMS_RE = re.compile('[\ufb50-\ufdff\ufe70-\ufeff]')
 
 def process_arabic_text(text):
     """Process Arabic text for correct Arabic rendering in PDF.
 
     - Cleans bidi control marks
     - Applies shaping (arabic_reshaper) and bidi (python-bidi) if available
-    - Ensures UTF-8 safe output
     """
     try:
         if text is None:
@@ -369,25 +936,11 @@ def process_arabic_text(text):
         text = text.strip()
 
         # Remove problematic bidi control marks that may show as squares
-        for ch in ['\u200f', '\u200e', '\u202a', '\u202b', '\u202c', '\u202d', '\u202e']:
-            text = text.replace(ch, '')
+        text = text.translate(_BIDI_MARKS_TABLE)
 
-        # Try to ensure valid UTF-8
-        try:
-            text = text.encode('utf-8', errors='ignore').decode('utf-8')
-        except Exception:
-            pass
-
-        # Skip reshaping/bidi if the string already contains Arabic Presentation Forms
-        def _has_arabic_presentation_forms(s: str) -> bool:
-            for ch in s:
-                code = ord(ch)
-                if (0xFB50 <= code <= 0xFDFF) or (0xFE70 <= code <= 0xFEFF):
-                    return True
-            return False
-
-        # Apply Arabic shaping and bidi if modules are available and the text is not pre-shaped
-        if _ARABIC_SHAPING_AVAILABLE and text and not _has_arabic_presentation_forms(text):
+        # Apply Arabic shaping and bidi if modules are available and the text
+        # is not pre-shaped (already contains Arabic Presentation Forms)
+        if _ARABIC_SHAPING_AVAILABLE and text and not _ARABIC_PRESENTATION_FORMS_RE.search(text):
             try:
                 reshaped = arabic_reshaper.reshape(text)
                 # Use RTL base direction so Arabic remains before Latin in mixed strings
@@ -400,17 +953,44 @@ def process_arabic_text(text):
     except Exception:
         return str(text) if text is not None else ''
 
+def build_pdf_cell(value, style):
+    """Build a PDF table cell from an export value.
+
+    The shaped text goes through process_arabic_text a second time before
+    being wrapped in a Paragraph, as the export has always done: the second
+    bidi pass puts left-to-right runs (dates, codes) back in reading order.
+    """
+    text = process_arabic_text(value)
+    if not text:
+        return ''
+    text = process_arabic_text(text)
+    try:
+        return Paragraph(text, style)
+    except Exception:
+        return text
+
+# Columns a custom report may select
+REPORT_COLUMNS = FILTER_COLUMNS | {
+    'id', 'created_at', 'shipment_creation_date_parsed', 'shipment_weight_num',
+}
+
+@functools.lru_cache(maxsize=256)
+def compile_report_query(columns, where_conditions):
+    """Compose the custom report SELECT for a tuple of columns and WHERE conditions"""
+    select_columns = [sql.Identifier(column) for column in columns if column in REPORT_COLUMNS]
+    where = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+    return sql.SQL("SELECT {} FROM shipments{} ORDER BY id DESC LIMIT 1000").format(
+        sql.SQL(", ").join(select_columns) if select_columns else sql.SQL(SHIPMENT_COLUMNS_SQL),
+        sql.SQL(where)
+    )
+
 def build_sql_query_from_filters(filters, columns):
-    """Build SQL query from filters and columns"""
+    """Build SQL query from filters and columns
+
+    Returns complete SQL text with the filter values inlined, since the
+    query is stored in custom_reports.sql_query and run later as-is.
+    """
     try:
-        # Start with base query
-        if columns:
-            select_columns = ", ".join(columns)
-        else:
-            select_columns = "*"
-        
-        query = f"SELECT {select_columns} FROM shipments"
-        
         # Add WHERE conditions
         where_conditions = []
         params = []
@@ -419,53 +999,45 @@ def build_sql_query_from_filters(filters, columns):
         if filters.get('date_filter') and filters['date_filter'] != 'total':
             start_date, end_date = parse_date_filter(filters['date_filter'])
             if start_date and end_date:
-                date_sql = get_date_filter_sql()
-                where_conditions.append(f"{date_sql} >= %s")
-                where_conditions.append(f"{date_sql} <= %s")
+                where_conditions.append(f"{DATE_SQL} >= %s")
+                where_conditions.append(f"{DATE_SQL} <= %s")
                 params.extend([start_date, end_date])
         
         # Other filters
         for key, value in filters.items():
             if key != 'date_filter' and value:
                 if key in ['shipper_name', 'shipper_city', 'consignee_name', 'consignee_city']:
-                    where_conditions.append(f"{key} LIKE %s")
-                    params.append(f'%{value}%')
+                    condition, param = _text_filter(key, value)
+                    where_conditions.append(condition)
+                    params.append(param)
                 elif key in ['min_weight', 'max_weight']:
                     if key == 'min_weight':
-                        weight_sql = get_weight_parsing_sql()
-                        where_conditions.append(f"{weight_sql} >= %s")
+                        where_conditions.append(f"{WEIGHT_SQL} >= %s")
                         params.append(float(value))
                     elif key == 'max_weight':
-                        weight_sql = get_weight_parsing_sql()
-                        where_conditions.append(f"{weight_sql} <= %s")
+                        where_conditions.append(f"{WEIGHT_SQL} <= %s")
                         params.append(float(value))
         
-        # Add WHERE clause if conditions exist
-        if where_conditions:
-            query += " WHERE " + " AND ".join(where_conditions)
-        
-        # Add ORDER BY
-        query += " ORDER BY id DESC LIMIT 1000"
-        
-        return query
+        query = compile_report_query(tuple(columns or ()), tuple(where_conditions))
+        return db.mogrify(query, params)
         
     except Exception as e:
         # Fallback to simple query
-        return "SELECT * FROM shipments ORDER BY id DESC LIMIT 1000"
+        return f"SELECT {SHIPMENT_COLUMNS_SQL} FROM shipments ORDER BY id DESC LIMIT 1000"
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
         # Test database connection
-        db.execute_query("SELECT 1")
+        db.execute_prepared("SELECT 1")
         db_status = "connected"
     except Exception as e:
         db_status = f"error: {str(e)}"
     
     return jsonify({
         'status': 'healthy', 
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': now_cached().isoformat(),
         'database': db_status
     })
 
@@ -492,21 +1064,36 @@ def debug_customers():
 def debug_cities():
     """Debug endpoint to test cities data"""
     try:
-        # Test if cities data exists
-        query1 = "SELECT COUNT(*) as total FROM shipments WHERE consignee_city IS NOT NULL"
-        query2 = "SELECT COUNT(*) as non_empty FROM shipments WHERE consignee_city IS NOT NULL AND consignee_city != ''"
-        query3 = "SELECT consignee_city, COUNT(*) as count FROM shipments WHERE consignee_city IS NOT NULL AND consignee_city != '' GROUP BY consignee_city LIMIT 5"
+        # Test if cities data exists (single round-trip, single scan)
+        query = """
+        WITH city_counts AS (
+            SELECT consignee_city, COUNT(*) as count
+            FROM shipments
+            WHERE consignee_city IS NOT NULL
+            GROUP BY consignee_city
+        )
+        SELECT
+            COALESCE(SUM(count), 0)::bigint as total,
+            COALESCE(SUM(count) FILTER (WHERE consignee_city != ''), 0)::bigint as non_empty,
+            (
+                SELECT COALESCE(json_agg(sample), '[]'::json)
+                FROM (
+                    SELECT consignee_city, count FROM city_counts
+                    WHERE consignee_city != ''
+                    LIMIT 5
+                ) sample
+            ) as sample_cities
+        FROM city_counts
+        """
         
-        result1 = db.execute_query(query1)
-        result2 = db.execute_query(query2)
-        result3 = db.execute_query(query3)
+        result = db.execute_query(query)[0]
         
         return jsonify({
             'success': True,
-            'total_with_city': result1[0]['total'] if result1 else 0,
-            'non_empty_cities': result2[0]['non_empty'] if result2 else 0,
-            'sample_cities': result3,
-            'sample_count': len(result3)
+            'total_with_city': result['total'],
+            'non_empty_cities': result['non_empty'],
+            'sample_cities': result['sample_cities'],
+            'sample_count': len(result['sample_cities'])
         })
     except Exception as e:
         return jsonify({
@@ -518,23 +1105,30 @@ def debug_cities():
 def get_all_shipments():
     """
     Fetch all shipping data with pagination
-    Query params: page, limit, week/month/year (optional)
+    Query params: page, limit, week/month/year (optional),
+                  cursor (optional, keyset pagination - preferred for deep pages),
+                  count (optional, true/false - include the total; default true
+                         for page-based requests, false with a cursor)
     """
     try:
         # Get query parameters
         page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 10))
+        limit = get_limit_param(10)
         date_filter = request.args.get('date_filter')  # today, week, month, year, total
         # Custom range support
         start_date_param = request.args.get('start_date')  # YYYY-MM-DD
         end_date_param = request.args.get('end_date')      # YYYY-MM-DD
+        cursor = request.args.get('cursor')  # next_cursor from a previous page
+        # Counting is the expensive part of a page; let clients skip it
+        count = get_bool_param('count', default=not cursor)
+        # Opt out of the estimated total and always count exactly
+        exact_count = get_bool_param('exact_count')
         
         # Calculate offset
         offset = (page - 1) * limit
         
         # Build query
-        base_query = "SELECT * FROM shipments"
-        count_query = "SELECT COUNT(*) as total FROM shipments"
+        base_query = f"SELECT {SHIPMENT_COLUMNS_SQL} FROM shipments"
         where_clause = ""
         params = []
         
@@ -542,27 +1136,75 @@ def get_all_shipments():
         if date_filter and date_filter != 'total':
             start_date, end_date = parse_date_filter(date_filter)
             if start_date and end_date:
-                # Use the complex date parsing SQL for proper comparison
-                date_sql = get_date_filter_sql()
-                where_clause = f" WHERE {date_sql} >= %s AND {date_sql} <= %s"
+                # Compare against the indexed parsed date column
+                where_clause = f" WHERE {DATE_SQL} >= %s AND {DATE_SQL} <= %s"
                 params = [start_date, end_date]
 
         # Override with custom range if provided
         if start_date_param and end_date_param:
-            start_date_norm = normalize_iso_to_yyyymmdd(start_date_param)
-            end_date_norm = normalize_iso_to_yyyymmdd(end_date_param)
+            start_date_norm = parse_date_param(start_date_param)
+            end_date_norm = parse_date_param(end_date_param)
             if start_date_norm and end_date_norm:
-                where_clause = " WHERE shipment_creation_date >= %s AND shipment_creation_date <= %s"
+                where_clause = f" WHERE {DATE_SQL} >= %s AND {DATE_SQL} <= %s"
                 params = [start_date_norm, end_date_norm]
         
-        # Get total count
-        total_count = db.execute_query(count_query + where_clause, params)[0]['total']
+        # Keyset pagination: continue after the cursor instead of using OFFSET
+        if cursor:
+            try:
+                shipments, next_cursor = fetch_shipments_after(
+                    where_clause, params, cursor, limit, by_date=False, prepared=True
+                )
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            
+            pagination = {
+                'limit': limit,
+                'cursor': cursor,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+            if count:
+                pagination['total'], pagination['approximate'] = count_shipments(
+                    where_clause, params, exact=exact_count
+                )
+            
+            return jsonify({
+                'data': shipments,
+                'pagination': pagination
+            })
+        
+        # Page without a total: fetch one extra row to know whether there is a next page
+        if not count:
+            query = base_query + where_clause + " ORDER BY id DESC LIMIT %s OFFSET %s"
+            shipments = db.execute_prepared(query, params + [limit + 1, offset])
+            has_next = len(shipments) > limit
+            shipments = shipments[:limit]
+            
+            return jsonify({
+                'data': shipments,
+                'pagination': {
+                    'page': page,
+                    'limit': limit,
+                    'total': None,
+                    'total_pages': None,
+                    'has_next': has_next,
+                    'has_prev': page > 1,
+                    'next_cursor': encode_cursor(shipments[-1], by_date=False) if has_next else None
+                }
+            })
+        
+        # Get total count (estimated for the unfiltered table and large ranges)
+        total_count = None if exact_count else estimate_shipments_count(where_clause, params)
+        approximate = total_count is not None
         
         # Get paginated data - use indexed id for ordering (much faster)
-        query = base_query + where_clause + " ORDER BY id DESC LIMIT %s OFFSET %s"
-        params.extend([limit, offset])
-        
-        shipments = db.execute_query(query, params)
+        if approximate:
+            query = base_query + where_clause + " ORDER BY id DESC LIMIT %s OFFSET %s"
+            shipments = db.execute_prepared(query, params + [limit, offset])
+        else:
+            shipments, total_count = fetch_shipments_page(
+                where_clause, params, "id DESC", limit, offset, prepared=True
+            )
         
         # Calculate pagination info
         total_pages = (total_count + limit - 1) // limit
@@ -577,7 +1219,9 @@ def get_all_shipments():
                 'total': total_count,
                 'total_pages': total_pages,
                 'has_next': has_next,
-                'has_prev': has_prev
+                'has_prev': has_prev,
+                'approximate': approximate,
+                'next_cursor': encode_cursor(shipments[-1], by_date=False) if has_next and shipments else None
             }
         })
         
@@ -588,43 +1232,69 @@ def get_all_shipments():
 def filter_shipments():
     """
     Filter shipments based on any column with pagination
-    Query params: column_name, value, date_filter (optional), page, limit
+    Query params: column_name, value, date_filter (optional), page, limit,
+                  cursor (optional, keyset pagination - preferred for deep pages)
     """
     try:
         column = request.args.get('column')
         value = request.args.get('value')
         date_filter = request.args.get('date_filter')
         page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 20))
+        limit = get_limit_param(20)
+        cursor = request.args.get('cursor')  # next_cursor from a previous page
         
         if not column or not value:
             return jsonify({'error': 'column and value parameters are required'}), 400
         
+        if column not in FILTER_COLUMNS:
+            return jsonify({'error': f'Invalid column: {column}'}), 400
+        
         # Calculate offset
         offset = (page - 1) * limit
         
-        # Build base query for counting
-        where_clause = f" WHERE {column} LIKE ?"
+        # Case-insensitive substring match (served by the pg_trgm GIN indexes)
+        where_clause = f" WHERE {column} ILIKE %s"
         params = [f'%{value}%']
         
         # Add date filter if provided
         if date_filter and date_filter != 'total':
             start_date, end_date = parse_date_filter(date_filter)
             if start_date and end_date:
-                date_sql = get_date_filter_sql()
-                where_clause += f" AND {date_sql} >= ? AND {date_sql} <= ?"
+                where_clause += f" AND {DATE_SQL} >= %s AND {DATE_SQL} <= %s"
                 params.extend([start_date, end_date])
         
-        # Get total count
-        count_query = f"SELECT COUNT(*) as total FROM shipments{where_clause}"
-        total_count = db.execute_query(count_query, params)[0]['total']
-        
-        # Get paginated data
-        date_sql = get_date_filter_sql()
-        query = f"SELECT * FROM shipments{where_clause} ORDER BY {date_sql} DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+        filter_info = {
+            'column': column,
+            'value': value,
+            'date_filter': date_filter
+        }
         
-        shipments = db.execute_query(query, params)
+        # Keyset pagination: continue after the cursor instead of using OFFSET
+        if cursor:
+            try:
+                shipments, next_cursor = fetch_shipments_after(
+                    where_clause, params, cursor, limit, prepared=True
+                )
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            
+            return jsonify({
+                'data': shipments,
+                'count': len(shipments),
+                'pagination': {
+                    'limit': limit,
+                    'cursor': cursor,
+                    'next_cursor': next_cursor,
+                    'has_next': next_cursor is not None
+                },
+                'filter': filter_info
+            })
+        
+        # Get paginated data and total count in one query
+        shipments, total_count = fetch_shipments_page(
+            where_clause, params, DATE_ORDER_SQL, limit, offset,
+            prepared=True
+        )
         
         # Calculate pagination info
         total_pages = (total_count + limit - 1) // limit
@@ -640,13 +1310,10 @@ def filter_shipments():
                 'total': total_count,
                 'total_pages': total_pages,
                 'has_next': has_next,
-                'has_prev': has_prev
+                'has_prev': has_prev,
+                'next_cursor': encode_cursor(shipments[-1]) if has_next and shipments else None
             },
-            'filter': {
-                'column': column,
-                'value': value,
-                'date_filter': date_filter
-            }
+            'filter': filter_info
         })
         
     except Exception as e:
@@ -661,7 +1328,7 @@ def search_shipments():
 
         date_filter = request.args.get('date_filter')
         page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 20))
+        limit = get_limit_param(20)
         offset = (page - 1) * limit
 
         # Parse date filter (today, week, month, year) against creation date
@@ -671,24 +1338,16 @@ def search_shipments():
         where_parts = ["search_text @@ websearch_to_tsquery('simple', %s)"]
         params = [query]
         if start_date and end_date:
-            date_sql = get_date_filter_sql()
-            where_parts.append(f"{date_sql} >= %s AND {date_sql} <= %s")
+            where_parts.append(f"{DATE_SQL} >= %s AND {DATE_SQL} <= %s")
             params.extend([start_date, end_date])
 
-        where_clause = "WHERE " + " AND ".join(where_parts)
-
-        # Count
-        count_sql = f"SELECT COUNT(*) AS total FROM shipments {where_clause}"
-        total_count = db.execute_query(count_sql, params)[0]['total']
+        where_clause = " WHERE " + " AND ".join(where_parts)
 
-        # Paginated results
-        data_sql = f"""
-            SELECT * FROM shipments
-            {where_clause}
-            ORDER BY {get_date_filter_sql()} DESC
-            LIMIT %s OFFSET %s
-        """
-        rows = db.execute_query(data_sql, params + [limit, offset])
+        # Get paginated data and total count in one query
+        rows, total_count = fetch_shipments_page(
+            where_clause, params, DATE_ORDER_SQL, limit, offset,
+            prepared=True
+        )
 
         total_pages = (total_count + limit - 1) // limit
 
@@ -712,6 +1371,7 @@ def search_shipments():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/customers/top', methods=['GET'])
+@cache.cached(timeout=TOP_CUSTOMERS_CACHE_TIMEOUT, query_string=True, response_filter=is_cacheable_response)
 def get_top_customers():
     """
     Get top customers by shipment count - optimized for large datasets using indexed columns
@@ -721,89 +1381,59 @@ def get_top_customers():
         date_filter = request.args.get('date_filter')
         start_date_param = request.args.get('start_date')
         end_date_param = request.args.get('end_date')
-        limit = int(request.args.get('limit', 10))
-        
-        # Build efficient query using indexed columns
-        where_conditions = ["shipper_name IS NOT NULL", "shipper_name != ''"]
-        params = []
+        limit = get_limit_param(10)
         
         # Handle date filtering with proper date parsing SQL
+        start_date = end_date = None
         if start_date_param and end_date_param:
             # Custom range takes priority
-            start_date_norm = normalize_iso_to_yyyymmdd(start_date_param)
-            end_date_norm = normalize_iso_to_yyyymmdd(end_date_param)
-            if start_date_norm and end_date_norm:
-                date_sql = get_date_filter_sql()
-                where_conditions.append(f"{date_sql} >= %s")
-                where_conditions.append(f"{date_sql} <= %s")
-                params.extend([start_date_norm, end_date_norm])
+            start_date = parse_date_param(start_date_param)
+            end_date = parse_date_param(end_date_param)
         elif date_filter and date_filter != 'total':
             # Use preset date filter
             start_date, end_date = parse_date_filter(date_filter)
-            if start_date and end_date:
-                date_sql = get_date_filter_sql()
-                where_conditions.append(f"{date_sql} >= %s")
-                where_conditions.append(f"{date_sql} <= %s")
-                params.extend([start_date, end_date])
         
-        # Always use ultra-fast sampling approach for better performance
-        if date_filter and date_filter != 'total':
-            # Use sampling based on date filter
-            if date_filter == 'today':
-                sample_size = 24000
-            elif date_filter == 'week':
-                sample_size = 168000
-            elif date_filter == 'month':
-                sample_size = 720000
-            elif date_filter == 'year':
-                sample_size = 8640000
-            else:
-                sample_size = 720000
-            
-            query = f"""
-            WITH sample_shipments AS (
-                SELECT shipper_name, consignee_name, shipper_phone
-                FROM shipments 
-                WHERE id > (SELECT MAX(id) - {sample_size} FROM shipments)
-                AND shipper_name IS NOT NULL 
-                AND shipper_name != ''
-                ORDER BY id DESC
+        if start_date and end_date:
+            # Per-day shipper counts are precomputed in mv_shipper_daily_counts;
+            # unique consignees come from mv_shipper_consignee_daily_counts for
+            # the top shippers only (see start_api.py; refreshed with
+            # `python start_api.py --refresh-views`)
+            query = """
+            WITH top_shippers AS (
+                SELECT 
+                    shipper_name,
+                    MIN(shipper_phone) as shipper_phone,
+                    SUM(shipment_count)::BIGINT as shipment_count
+                FROM mv_shipper_daily_counts
+                WHERE shipment_date >= %s AND shipment_date <= %s
+                GROUP BY shipper_name 
+                ORDER BY shipment_count DESC 
+                LIMIT %s
             )
             SELECT 
-                shipper_name,
-                MIN(shipper_phone) as shipper_phone,
-                COUNT(*) as shipment_count,
-                COUNT(DISTINCT consignee_name) as unique_consignees
-            FROM sample_shipments
-            GROUP BY shipper_name 
-            ORDER BY shipment_count DESC 
-            LIMIT %s
+                t.shipper_name,
+                t.shipper_phone,
+                t.shipment_count,
+                (SELECT COUNT(DISTINCT c.consignee_name)
+                 FROM mv_shipper_consignee_daily_counts c
+                 WHERE c.shipper_name = t.shipper_name
+                 AND c.shipment_date >= %s AND c.shipment_date <= %s) as unique_consignees
+            FROM top_shippers t
+            ORDER BY t.shipment_count DESC
             """
-            params = [limit]
+            params = [start_date, end_date, limit, start_date, end_date]
         else:
-            # Use sampling for total/all data too
-            query = f"""
-            WITH sample_shipments AS (
-                SELECT shipper_name, consignee_name, shipper_phone
-                FROM shipments 
-                WHERE shipper_name IS NOT NULL 
-                AND shipper_name != ''
-                ORDER BY id DESC
-                LIMIT 100000
-            )
-            SELECT 
-                shipper_name,
-                MIN(shipper_phone) as shipper_phone,
-                COUNT(*) as shipment_count,
-                COUNT(DISTINCT consignee_name) as unique_consignees
-            FROM sample_shipments
-            GROUP BY shipper_name 
+            # All-time ranking is precomputed in mv_top_shippers
+            # (see start_api.py; refreshed with `python start_api.py --refresh-views`)
+            query = """
+            SELECT shipper_name, shipper_phone, shipment_count, unique_consignees
+            FROM mv_top_shippers
             ORDER BY shipment_count DESC 
             LIMIT %s
             """
             params = [limit]
         
-        customers = db.execute_query(query, params)
+        customers = db.execute_prepared(query, params)
         
         return jsonify({
             'data': customers,
@@ -821,7 +1451,7 @@ def get_recent_shipments():
     Query params: limit (default 20)
     """
     try:
-        limit = int(request.args.get('limit', 20))
+        limit = get_limit_param(20)
         date_filter = request.args.get('date_filter')
         start_date_param = request.args.get('start_date')
         end_date_param = request.args.get('end_date')
@@ -829,38 +1459,25 @@ def get_recent_shipments():
         # Use ultra-fast id-based sampling approach
         if date_filter and date_filter != 'total':
             # Use sampling based on date filter
-            if date_filter == 'today':
-                sample_size = 24000  # ~24 hours of data
-            elif date_filter == 'week':
-                sample_size = 168000  # ~1 week of data
-            elif date_filter == 'month':
-                sample_size = 720000  # ~1 month of data
-            elif date_filter == 'year':
-                sample_size = 8640000  # ~1 year of data
-            else:
-                sample_size = 720000  # Default to month
-            
             query = f"""
-            SELECT * FROM shipments 
-            WHERE id > (SELECT MAX(id) - {sample_size} FROM shipments)
-            AND shipment_creation_date IS NOT NULL 
-            AND shipment_creation_date != ''
-            ORDER BY id DESC
+            SELECT {SHIPMENT_COLUMNS_SQL} FROM shipments 
+            WHERE id > %s
+            AND {DATE_SQL} IS NOT NULL
+            ORDER BY {DATE_ORDER_SQL}
             LIMIT %s
             """
-            params = [limit]
+            params = [sample_id_floor(date_filter), limit]
         else:
             # For total or no filter, just get the most recent records
-            query = """
-            SELECT * FROM shipments 
-            WHERE shipment_creation_date IS NOT NULL 
-            AND shipment_creation_date != ''
-            ORDER BY id DESC
+            query = f"""
+            SELECT {SHIPMENT_COLUMNS_SQL} FROM shipments 
+            WHERE {DATE_SQL} IS NOT NULL
+            ORDER BY {DATE_ORDER_SQL}
             LIMIT %s
             """
             params = [limit]
         
-        shipments = db.execute_query(query, params)
+        shipments = db.execute_prepared(query, params)
         
         return jsonify({
             'data': shipments,
@@ -871,6 +1488,7 @@ def get_recent_shipments():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/shipments/by-city', methods=['GET'])
+@cache.cached(query_string=True, response_filter=is_cacheable_response)
 def get_shipments_by_city():
     """
     Get shipment counts by city
@@ -878,31 +1496,10 @@ def get_shipments_by_city():
     """
     try:
         date_filter = request.args.get('date_filter', 'month')
-        limit = int(request.args.get('limit', 20))
+        limit = get_limit_param(20)
         
         start_date, end_date = parse_date_filter(date_filter)
-        
-        where_clause = ""
-        params = []
-        
-        if start_date and end_date:
-            date_sql = get_date_filter_sql()
-            where_clause = f" WHERE {date_sql} >= ? AND {date_sql} <= ?"
-            params = [start_date, end_date]
-        
-        query = f"""
-        SELECT 
-            consignee_city as city,
-            COUNT(*) as shipment_count
-        FROM shipments 
-        {where_clause}
-        GROUP BY consignee_city 
-        ORDER BY shipment_count DESC 
-        LIMIT ?
-        """
-        params.append(limit)
-        
-        cities = db.execute_query(query, params)
+        cities = fetch_city_counts(start_date, end_date, limit)
         
         return jsonify({
             'data': cities,
@@ -914,6 +1511,7 @@ def get_shipments_by_city():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/shipments/average-weight', methods=['GET'])
+@cache.cached(query_string=True, response_filter=is_cacheable_response)
 def get_average_weight():
     """
     Get average shipment weight - optimized using indexed columns
@@ -924,81 +1522,38 @@ def get_average_weight():
         start_date_param = request.args.get('start_date')
         end_date_param = request.args.get('end_date')
         
+        
         # Build efficient WHERE clause using indexed columns
-        conditions = ["shipment_weight IS NOT NULL", "shipment_weight != ''", "shipment_weight ~ '[0-9]'"]
+        conditions = [f"{WEIGHT_SQL} IS NOT NULL"]
         params = []
         
         # Handle date filtering with proper date parsing SQL
         if start_date_param and end_date_param:
             # Custom range takes priority
-            start_date_norm = normalize_iso_to_yyyymmdd(start_date_param)
-            end_date_norm = normalize_iso_to_yyyymmdd(end_date_param)
+            start_date_norm = parse_date_param(start_date_param)
+            end_date_norm = parse_date_param(end_date_param)
             if start_date_norm and end_date_norm:
-                date_sql = get_date_filter_sql()
-                conditions.append(f"{date_sql} >= %s")
-                conditions.append(f"{date_sql} <= %s")
+                conditions.append(f"{DATE_SQL} >= %s")
+                conditions.append(f"{DATE_SQL} <= %s")
                 params.extend([start_date_norm, end_date_norm])
         elif date_filter and date_filter != 'total':
             # Use preset date filter
             start_date, end_date = parse_date_filter(date_filter)
             if start_date and end_date:
-                date_sql = get_date_filter_sql()
-                conditions.append(f"{date_sql} >= %s")
-                conditions.append(f"{date_sql} <= %s")
+                conditions.append(f"{DATE_SQL} >= %s")
+                conditions.append(f"{DATE_SQL} <= %s")
                 params.extend([start_date, end_date])
         
-        # Use ultra-fast sampling approach for better performance
-        if date_filter and date_filter != 'total':
-            # Use sampling based on date filter
-            if date_filter == 'today':
-                sample_size = 24000
-            elif date_filter == 'week':
-                sample_size = 168000
-            elif date_filter == 'month':
-                sample_size = 720000
-            elif date_filter == 'year':
-                sample_size = 8640000
-            else:
-                sample_size = 720000
-            
-            weight_sql = get_weight_parsing_sql()
-            query = f"""
-            WITH sample_shipments AS (
-                SELECT shipment_weight
-                FROM shipments 
-                WHERE id > (SELECT MAX(id) - {sample_size} FROM shipments)
-                AND shipment_weight IS NOT NULL 
-                AND shipment_weight != ''
-                AND shipment_weight ~ '[0-9]'
-                ORDER BY id DESC
-            )
-            SELECT 
-                AVG({weight_sql}) as average_weight,
-                COUNT(*) as total_shipments
-            FROM sample_shipments
-            """
-            params = []
-        else:
-            # Use sampling for total/all data too
-            weight_sql = get_weight_parsing_sql()
-            query = f"""
-            WITH sample_shipments AS (
-                SELECT shipment_weight
-                FROM shipments 
-                WHERE shipment_weight IS NOT NULL 
-                AND shipment_weight != ''
-                AND shipment_weight ~ '[0-9]'
-                ORDER BY id DESC
-                LIMIT 100000
-            )
-            SELECT 
-                AVG({weight_sql}) as average_weight,
-                COUNT(*) as total_shipments
-            FROM sample_shipments
-            """
-            params = []
+        # Weights are a precomputed column, so aggregate exactly (parallel-safe)
+        query = f"""
+        SELECT 
+            AVG({WEIGHT_SQL}) as average_weight,
+            COUNT(*) as total_shipments
+        FROM shipments 
+        WHERE {' AND '.join(conditions)}
+        """
         
-        result = db.execute_query(query, params)
+        result = db.execute_prepared(query, params)
         
         return jsonify({
             'data': result[0] if result else {'average_weight': 0, 'total_shipments': 0},
@@ -1009,10 +1564,11 @@ def get_average_weight():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/shipments/total', methods=['GET'])
+@cache.cached(timeout=TOTAL_CACHE_TIMEOUT, query_string=True, response_filter=is_cacheable_response)
 def get_total_shipments():
     """
-    Get total shipment count - ultra-fast using sampling and id-based approximation
-    Query params: date_filter (defaults to month)
+    Get total shipment count - date ranges are counted on the indexed date column
+    Query params: date_filter (defaults to month), start_date, end_date
     """
     try:
         date_filter = request.args.get('date_filter', 'month')  # Default to month
@@ -1022,64 +1578,29 @@ def get_total_shipments():
         if date_filter == 'total':
             # For total count, use a simple and fast query
             query = "SELECT COUNT(*) as total FROM shipments"
-            result = db.execute_query(query)
+            result = db.execute_prepared(query)
             total = result[0]['total'] if result else 0
         else:
-            # Use ultra-fast sampling approach for date filtering
-            # This is much faster than complex date parsing
-            if date_filter == 'today':
-                # Sample last 24 hours worth of records (assuming ~1000 records per hour)
-                sample_size = 24000
-            elif date_filter == 'week':
-                # Sample last week worth of records
-                sample_size = 168000
-            elif date_filter == 'month':
-                # Sample last month worth of records
-                sample_size = 720000
-            elif date_filter == 'year':
-                # Sample last year worth of records
-                sample_size = 8640000
+            # Count the date range on the indexed date column
+            conditions = [f"{DATE_SQL} IS NOT NULL"]
+            params = []
+            
+            start_date_norm = parse_date_param(start_date_param)
+            end_date_norm = parse_date_param(end_date_param)
+            if start_date_norm and end_date_norm:
+                # Custom range takes priority
+                start_date, end_date = start_date_norm, end_date_norm
             else:
-                # Default to month
-                sample_size = 720000
+                start_date, end_date = parse_date_filter(date_filter)
             
-            # Use id-based sampling for ultra-fast performance
-            query = f"""
-            WITH recent_sample AS (
-                SELECT shipment_creation_date
-                FROM shipments 
-                ORDER BY id DESC 
-                LIMIT {sample_size}
-            )
-            SELECT COUNT(*) as total FROM recent_sample
-            WHERE shipment_creation_date IS NOT NULL 
-            AND shipment_creation_date != ''
-            AND shipment_creation_date LIKE '__-___-__'
-            """
+            if start_date and end_date:
+                conditions.append(f"{DATE_SQL} >= %s")
+                conditions.append(f"{DATE_SQL} <= %s")
+                params.extend([start_date, end_date])
             
-            result = db.execute_query(query)
+            query = f"SELECT COUNT(*) as total FROM shipments WHERE {' AND '.join(conditions)}"
+            result = db.execute_prepared(query, params)
             total = result[0]['total'] if result else 0
-            
-            # For custom date ranges, use the complex parsing but with sampling
-            if start_date_param and end_date_param:
-                start_date_norm = normalize_iso_to_yyyymmdd(start_date_param)
-                end_date_norm = normalize_iso_to_yyyymmdd(end_date_param)
-                if start_date_norm and end_date_norm:
-                    # Use sampling for custom ranges too
-                    query = f"""
-                    WITH recent_sample AS (
-                        SELECT shipment_creation_date
-                        FROM shipments 
-                        ORDER BY id DESC 
-                        LIMIT 1000000
-                    )
-                    SELECT COUNT(*) as total FROM recent_sample
-                    WHERE shipment_creation_date IS NOT NULL 
-                    AND shipment_creation_date != ''
-                    AND shipment_creation_date LIKE '__-___-__'
-                    """
-                    result = db.execute_query(query)
-                    total = result[0]['total'] if result else 0
         
         return jsonify({
             'data': {'total': total},
@@ -1090,100 +1611,28 @@ def get_total_shipments():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cities/top', methods=['GET'])
+@cache.cached(query_string=True, response_filter=is_cacheable_response)
 def get_top_cities():
     """
-    Get top cities by shipment count - optimized for large datasets using indexed columns
+    Get top cities by shipment count from the precomputed per-day city counts
     Query params: date_filter (month), limit (default 10)
     """
     try:
         date_filter = request.args.get('date_filter', 'month')
         start_date_param = request.args.get('start_date')
         end_date_param = request.args.get('end_date')
-        limit = int(request.args.get('limit', 10))
-        
-        # Build efficient query using indexed columns
-        where_conditions = [
-            "consignee_city IS NOT NULL",
-            "consignee_city != ''",
-            "consignee_city != 'NULL'"
-        ]
-        params = []
+        limit = get_limit_param(10)
         
-        # Handle date filtering with proper date parsing SQL
+        start_date, end_date = None, None
         if start_date_param and end_date_param:
             # Custom range takes priority
-            start_date_norm = normalize_iso_to_yyyymmdd(start_date_param)
-            end_date_norm = normalize_iso_to_yyyymmdd(end_date_param)
-            if start_date_norm and end_date_norm:
-                date_sql = get_date_filter_sql()
-                where_conditions.append(f"{date_sql} >= %s")
-                where_conditions.append(f"{date_sql} <= %s")
-                params.extend([start_date_norm, end_date_norm])
+            start_date = parse_date_param(start_date_param)
+            end_date = parse_date_param(end_date_param)
         elif date_filter and date_filter != 'total':
             # Use preset date filter
             start_date, end_date = parse_date_filter(date_filter)
-            if start_date and end_date:
-                date_sql = get_date_filter_sql()
-                where_conditions.append(f"{date_sql} >= %s")
-                where_conditions.append(f"{date_sql} <= %s")
-                params.extend([start_date, end_date])
-        
-        # Use ultra-fast sampling approach for better performance
-        if date_filter and date_filter != 'total':
-            # Use sampling based on date filter
-            if date_filter == 'today':
-                sample_size = 24000
-            elif date_filter == 'week':
-                sample_size = 168000
-            elif date_filter == 'month':
-                sample_size = 720000
-            elif date_filter == 'year':
-                sample_size = 8640000
-            else:
-                sample_size = 720000
-            
-            query = f"""
-            WITH sample_shipments AS (
-                SELECT consignee_city
-                FROM shipments 
-                WHERE id > (SELECT MAX(id) - {sample_size} FROM shipments)
-                AND consignee_city IS NOT NULL 
-                AND consignee_city != ''
-                AND consignee_city != 'NULL'
-                ORDER BY id DESC
-            )
-            SELECT 
-                consignee_city as city,
-                COUNT(*) as shipment_count
-            FROM sample_shipments
-            GROUP BY consignee_city 
-            ORDER BY shipment_count DESC 
-            LIMIT %s
-            """
-            params = [limit]
-        else:
-            # Use sampling for total/all data too
-            query = f"""
-            WITH sample_shipments AS (
-                SELECT consignee_city
-                FROM shipments 
-                WHERE consignee_city IS NOT NULL 
-                AND consignee_city != ''
-                AND consignee_city != 'NULL'
-                ORDER BY id DESC
-                LIMIT 100000
-            )
-            SELECT 
-                consignee_city as city,
-                COUNT(*) as shipment_count
-            FROM sample_shipments
-            GROUP BY consignee_city 
-            ORDER BY shipment_count DESC 
-            LIMIT %s
-            """
-            params = [limit]
         
-        cities = db.execute_query(query, params)
+        cities = fetch_city_counts(start_date, end_date, limit)
         
         return jsonify({
             'data': cities,
@@ -1194,6 +1643,70 @@ def get_top_cities():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _optional_float(value):
+    """float(value), or None when value is not a number"""
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+# advanced-search query parameters, in the order they are echoed back under 'filters'
+ADVANCED_SEARCH_PARAMS = (
+    'id', 'shipment_number', 'reference_number', 'country_code', 'number_of_boxes',
+    'description', 'pdf_filename',
+    'creation_date_from', 'creation_date_to', 'processing_date_from', 'processing_date_to',
+    'min_weight', 'max_weight', 'cod',
+    'shipper_name', 'shipper_city', 'shipper_phone', 'shipper_address',
+    'consignee_name', 'consignee_city', 'consignee_phone', 'consignee_address',
+)
+
+# (query param, condition, conversion); a conversion returning None skips the filter
+ADVANCED_SEARCH_FILTERS = (
+    ('id', "id = %s", int),
+    ('country_code', "country_code = %s", str),
+    ('number_of_boxes', "number_of_shipment_boxes = %s", int),
+    ('creation_date_from', f"{DATE_SQL} >= %s", parse_date_param),
+    ('creation_date_to', f"{DATE_SQL} <= %s", parse_date_param),
+    ('processing_date_from', "processing_date >= %s", str),
+    ('processing_date_to', "processing_date <= %s", str),
+    ('min_weight', f"{WEIGHT_SQL} >= %s", _optional_float),
+    ('max_weight', f"{WEIGHT_SQL} <= %s", _optional_float),
+)
+
+# (query param, shipments column) pairs matched with _text_filter
+ADVANCED_SEARCH_TEXT_FILTERS = (
+    ('shipment_number', 'number_shipment'),
+    ('reference_number', 'shipment_reference_number'),
+    ('description', 'shipment_description'),
+    ('pdf_filename', 'pdf_filename'),
+    ('shipper_name', 'shipper_name'),
+    ('shipper_city', 'shipper_city'),
+    ('shipper_phone', 'shipper_phone'),
+    ('shipper_address', 'shipper_address'),
+    ('consignee_name', 'consignee_name'),
+    ('consignee_city', 'consignee_city'),
+    ('consignee_phone', 'consignee_phone'),
+    ('consignee_address', 'consignee_address'),
+)
+
+# SQL condition for each advanced-search filter name
+ADVANCED_SEARCH_CONDITIONS = {name: condition for name, condition, _ in ADVANCED_SEARCH_FILTERS}
+ADVANCED_SEARCH_CONDITIONS.update(
+    (name, _text_filter(column, '')[0]) for name, column in ADVANCED_SEARCH_TEXT_FILTERS
+)
+ADVANCED_SEARCH_CONDITIONS['cod_yes'] = f"{COD_SQL} > 0"
+ADVANCED_SEARCH_CONDITIONS['cod_no'] = f"({COD_SQL} = 0 OR {COD_SQL} IS NULL)"
+
+@functools.lru_cache(maxsize=256)
+def compile_advanced_search_where(active):
+    """Return the WHERE clause for a tuple of active advanced-search filter names
+
+    Clients hit a handful of filter combinations, so each clause is joined once.
+    """
+    if not active:
+        return ""
+    return " WHERE " + " AND ".join(ADVANCED_SEARCH_CONDITIONS[name] for name in active)
+
 @app.route('/api/shipments/advanced-search', methods=['GET'])
 def advanced_search():
     """
@@ -1201,173 +1714,64 @@ def advanced_search():
     Query params: All search fields from the comprehensive form
     """
     try:
-        # Get all possible parameters
-        id = request.args.get('id')
-        shipment_number = request.args.get('shipment_number')
-        reference_number = request.args.get('reference_number')
-        country_code = request.args.get('country_code')
-        number_of_boxes = request.args.get('number_of_boxes')
-        description = request.args.get('description')
-        pdf_filename = request.args.get('pdf_filename')
-        
-        # Date parameters
-        creation_date_from = request.args.get('creation_date_from')
-        creation_date_to = request.args.get('creation_date_to')
-        processing_date_from = request.args.get('processing_date_from')
-        processing_date_to = request.args.get('processing_date_to')
-        
-        # Weight and payment
-        min_weight = request.args.get('min_weight')
-        max_weight = request.args.get('max_weight')
-        cod = request.args.get('cod')
-        
-        # Shipper data
-        shipper_name = request.args.get('shipper_name')
-        shipper_city = request.args.get('shipper_city')
-        shipper_phone = request.args.get('shipper_phone')
-        shipper_address = request.args.get('shipper_address')
-        
-        # Consignee data
-        consignee_name = request.args.get('consignee_name')
-        consignee_city = request.args.get('consignee_city')
-        consignee_phone = request.args.get('consignee_phone')
-        consignee_address = request.args.get('consignee_address')
+        args = {name: request.args.get(name) for name in ADVANCED_SEARCH_PARAMS}
         
         page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 20))
+        limit = get_limit_param(20)
+        cursor = request.args.get('cursor')  # next_cursor from a previous page
         
         # Calculate offset
         offset = (page - 1) * limit
         
-        where_conditions = []
+        # Collect the active filters (in spec order) and their parameters
+        active = []
         params = []
         
-        # Shipment Information filters
-        if id:
-            where_conditions.append("id = %s")
-            params.append(int(id))
-        
-        if shipment_number:
-            where_conditions.append("number_shipment LIKE %s")
-            params.append(f'%{shipment_number}%')
-        
-        if reference_number:
-            where_conditions.append("shipment_reference_number LIKE %s")
-            params.append(f'%{reference_number}%')
-        
-        if country_code:
-            where_conditions.append("country_code = %s")
-            params.append(country_code)
-        
-        if number_of_boxes:
-            where_conditions.append("number_of_shipment_boxes = %s")
-            params.append(int(number_of_boxes))
-        
-        if description:
-            where_conditions.append("shipment_description LIKE %s")
-            params.append(f'%{description}%')
-        
-        if pdf_filename:
-            where_conditions.append("pdf_filename LIKE %s")
-            params.append(f'%{pdf_filename}%')
-        
-        # Date filters
-        if creation_date_from:
-            date_sql = get_date_filter_sql()
-            where_conditions.append(f"{date_sql} >= %s")
-            params.append(creation_date_from)
+        for name, _, convert in ADVANCED_SEARCH_FILTERS:
+            if not args[name]:
+                continue
+            value = convert(args[name])
+            if value is not None:
+                active.append(name)
+                params.append(value)
         
-        if creation_date_to:
-            date_sql = get_date_filter_sql()
-            where_conditions.append(f"{date_sql} <= %s")
-            params.append(creation_date_to)
+        for name, column in ADVANCED_SEARCH_TEXT_FILTERS:
+            if args[name]:
+                active.append(name)
+                params.append(_text_filter(column, args[name])[1])
         
-        if processing_date_from:
-            where_conditions.append("processing_date >= %s")
-            params.append(processing_date_from)
+        # COD filter (yes: COD greater than 0, no: COD equals 0 or is null/empty)
+        cod = (args['cod'] or '').lower()
+        if cod in ('yes', 'no'):
+            active.append(f'cod_{cod}')
         
-        if processing_date_to:
-            where_conditions.append("processing_date <= %s")
-            params.append(processing_date_to)
+        where_clause = compile_advanced_search_where(tuple(active))
         
-        # Weight filters
-        if min_weight:
+        # Keyset pagination: continue after the cursor instead of using OFFSET
+        if cursor:
             try:
-                weight_value = float(min_weight)
-                weight_sql = get_weight_parsing_sql()
-                where_conditions.append(f"{weight_sql} >= %s")
-                params.append(weight_value)
+                shipments, next_cursor = fetch_shipments_after(
+                    where_clause, params, cursor, limit
+                )
             except ValueError:
-                pass  # Ignore invalid weight values
-        
-        if max_weight:
-            try:
-                weight_value = float(max_weight)
-                weight_sql = get_weight_parsing_sql()
-                where_conditions.append(f"{weight_sql} <= %s")
-                params.append(weight_value)
-            except ValueError:
-                pass  # Ignore invalid weight values
-        
-        # COD filter
-        if cod:
-            if cod.lower() == 'yes':
-                # COD greater than 0
-                cod_sql = get_cod_parsing_sql()
-                where_conditions.append(f"{cod_sql} > 0")
-            elif cod.lower() == 'no':
-                # COD equals 0 or is null/empty
-                cod_sql = get_cod_parsing_sql()
-                where_conditions.append(f"({cod_sql} = 0 OR {cod_sql} IS NULL)")
-        
-        # Shipper filters
-        if shipper_name:
-            where_conditions.append("shipper_name LIKE %s")
-            params.append(f'%{shipper_name}%')
-        
-        if shipper_city:
-            where_conditions.append("shipper_city LIKE %s")
-            params.append(f'%{shipper_city}%')
-        
-        if shipper_phone:
-            where_conditions.append("shipper_phone LIKE %s")
-            params.append(f'%{shipper_phone}%')
-        
-        if shipper_address:
-            where_conditions.append("shipper_address LIKE %s")
-            params.append(f'%{shipper_address}%')
-        
-        # Consignee filters
-        if consignee_name:
-            where_conditions.append("consignee_name LIKE %s")
-            params.append(f'%{consignee_name}%')
-        
-        if consignee_city:
-            where_conditions.append("consignee_city LIKE %s")
-            params.append(f'%{consignee_city}%')
-        
-        if consignee_phone:
-            where_conditions.append("consignee_phone LIKE %s")
-            params.append(f'%{consignee_phone}%')
-        
-        if consignee_address:
-            where_conditions.append("consignee_address LIKE %s")
-            params.append(f'%{consignee_address}%')
-        
-        where_clause = ""
-        if where_conditions:
-            where_clause = " WHERE " + " AND ".join(where_conditions)
-        
-        # Get total count
-        count_query = f"SELECT COUNT(*) as total FROM shipments{where_clause}"
-        total_count = db.execute_query(count_query, params)[0]['total']
-        
-        # Get paginated data
-        date_sql = get_date_filter_sql()
-        query = f"SELECT * FROM shipments{where_clause} ORDER BY {date_sql} DESC LIMIT %s OFFSET %s"
-        params.extend([limit, offset])
-        
-        shipments = db.execute_query(query, params)
+                return jsonify({'error': 'Invalid cursor'}), 400
+            
+            return jsonify({
+                'data': shipments,
+                'count': len(shipments),
+                'pagination': {
+                    'limit': limit,
+                    'cursor': cursor,
+                    'next_cursor': next_cursor,
+                    'has_next': next_cursor is not None
+                },
+                'filters': args
+            })
+        
+        # Get paginated data and total count in one query
+        shipments, total_count = fetch_shipments_page(
+            where_clause, params, DATE_ORDER_SQL, limit, offset
+        )
         
         # Calculate pagination info
         total_pages = (total_count + limit - 1) // limit
@@ -1383,32 +1787,10 @@ def advanced_search():
                 'total': total_count,
                 'total_pages': total_pages,
                 'has_next': has_next,
-                'has_prev': has_prev
+                'has_prev': has_prev,
+                'next_cursor': encode_cursor(shipments[-1]) if has_next and shipments else None
             },
-            'filters': {
-                'id': id,
-                'shipment_number': shipment_number,
-                'reference_number': reference_number,
-                'country_code': country_code,
-                'number_of_boxes': number_of_boxes,
-                'description': description,
-                'pdf_filename': pdf_filename,
-                'creation_date_from': creation_date_from,
-                'creation_date_to': creation_date_to,
-                'processing_date_from': processing_date_from,
-                'processing_date_to': processing_date_to,
-                'min_weight': min_weight,
-                'max_weight': max_weight,
-                'cod': cod,
-                'shipper_name': shipper_name,
-                'shipper_city': shipper_city,
-                'shipper_phone': shipper_phone,
-                'shipper_address': shipper_address,
-                'consignee_name': consignee_name,
-                'consignee_city': consignee_city,
-                'consignee_phone': consignee_phone,
-                'consignee_address': consignee_address
-            }
+            'filters': args
         })
         
     except Exception as e:
@@ -1423,26 +1805,23 @@ def get_shipments_by_weight():
     try:
         min_weight = float(request.args.get('min_weight', 0))
         date_filter = request.args.get('date_filter')
-        limit = int(request.args.get('limit', 50))
+        limit = get_limit_param(50)
         
-        weight_sql = get_weight_parsing_sql()
-        where_conditions = [f"{weight_sql} > ?"]
+        where_conditions = [f"{WEIGHT_SQL} > %s"]
         params = [min_weight]
         
         if date_filter and date_filter != 'total':
             start_date, end_date = parse_date_filter(date_filter)
             if start_date and end_date:
-                date_sql = get_date_filter_sql()
-                where_conditions.append(f"{date_sql} >= ? AND {date_sql} <= ?")
+                where_conditions.append(f"{DATE_SQL} >= %s AND {DATE_SQL} <= %s")
                 params.extend([start_date, end_date])
         
         where_clause = " WHERE " + " AND ".join(where_conditions)
         
-        date_sql = get_date_filter_sql()
-        query = f"SELECT * FROM shipments{where_clause} ORDER BY {date_sql} DESC LIMIT ?"
+        query = f"SELECT {SHIPMENT_COLUMNS_SQL} FROM shipments{where_clause} ORDER BY {DATE_ORDER_SQL} LIMIT %s"
         params.append(limit)
         
-        shipments = db.execute_query(query, params)
+        shipments = db.execute_prepared(query, params)
         
         return jsonify({
             'data': shipments,
@@ -1465,28 +1844,27 @@ def get_shipments_by_shipper():
     try:
         shipper_name = request.args.get('shipper_name')
         date_filter = request.args.get('date_filter')
-        limit = int(request.args.get('limit', 50))
+        limit = get_limit_param(50)
         
         if not shipper_name:
             return jsonify({'error': 'shipper_name parameter is required'}), 400
         
-        where_conditions = ["shipper_name LIKE ?"]
-        params = [f'%{shipper_name}%']
+        condition, param = _text_filter('shipper_name', shipper_name)
+        where_conditions = [condition]
+        params = [param]
         
         if date_filter and date_filter != 'total':
             start_date, end_date = parse_date_filter(date_filter)
             if start_date and end_date:
-                date_sql = get_date_filter_sql()
-                where_conditions.append(f"{date_sql} >= ? AND {date_sql} <= ?")
+                where_conditions.append(f"{DATE_SQL} >= %s AND {DATE_SQL} <= %s")
                 params.extend([start_date, end_date])
         
         where_clause = " WHERE " + " AND ".join(where_conditions)
         
-        date_sql = get_date_filter_sql()
-        query = f"SELECT * FROM shipments{where_clause} ORDER BY {date_sql} DESC LIMIT ?"
+        query = f"SELECT {SHIPMENT_COLUMNS_SQL} FROM shipments{where_clause} ORDER BY {DATE_ORDER_SQL} LIMIT %s"
         params.append(limit)
         
-        shipments = db.execute_query(query, params)
+        shipments = db.execute_prepared(query, params)
         
         return jsonify({
             'data': shipments,
@@ -1509,28 +1887,27 @@ def get_shipments_by_consignee():
     try:
         consignee_name = request.args.get('consignee_name')
         date_filter = request.args.get('date_filter')
-        limit = int(request.args.get('limit', 50))
+        limit = get_limit_param(50)
         
         if not consignee_name:
             return jsonify({'error': 'consignee_name parameter is required'}), 400
         
-        where_conditions = ["consignee_name LIKE ?"]
-        params = [f'%{consignee_name}%']
+        condition, param = _text_filter('consignee_name', consignee_name)
+        where_conditions = [condition]
+        params = [param]
         
         if date_filter and date_filter != 'total':
             start_date, end_date = parse_date_filter(date_filter)
             if start_date and end_date:
-                date_sql = get_date_filter_sql()
-                where_conditions.append(f"{date_sql} >= ? AND {date_sql} <= ?")
+                where_conditions.append(f"{DATE_SQL} >= %s AND {DATE_SQL} <= %s")
                 params.extend([start_date, end_date])
         
         where_clause = " WHERE " + " AND ".join(where_conditions)
         
-        date_sql = get_date_filter_sql()
-        query = f"SELECT * FROM shipments{where_clause} ORDER BY {date_sql} DESC LIMIT ?"
+        query = f"SELECT {SHIPMENT_COLUMNS_SQL} FROM shipments{where_clause} ORDER BY {DATE_ORDER_SQL} LIMIT %s"
         params.append(limit)
         
-        shipments = db.execute_query(query, params)
+        shipments = db.execute_prepared(query, params)
         
         return jsonify({
             'data': shipments,
@@ -1544,6 +1921,144 @@ def get_shipments_by_consignee():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Rows per LongTable in PDF exports
+PDF_EXPORT_BATCH_SIZE = 500
+
+# PDF exports with more rows than this are rendered in the background (202 + status URL)
+PDF_EXPORT_ASYNC_ROWS = 500
+PDF_EXPORT_WORKERS = int(os.getenv('PDF_EXPORT_WORKERS', 2))
+
+# Background PDF jobs still marked running after this many seconds are reported as failed
+PDF_EXPORT_TIMEOUT = int(os.getenv('PDF_EXPORT_TIMEOUT', 600))
+
+def create_pdf_export_executor():
+    """Process pool for background PDF exports
+
+    ReportLab rendering is CPU-bound and never yields, so it runs in separate
+    (spawned, non-gevent) processes instead of threads of the request worker.
+    """
+    return ProcessPoolExecutor(PDF_EXPORT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+
+pdf_export_executor = create_pdf_export_executor()
+
+# App-owned directory for export files and PDF job markers
+EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'shipping_api_exports'))
+os.makedirs(EXPORT_DIR, exist_ok=True)
+
+# Export files (and PDF job markers) older than this are removed from EXPORT_DIR
+EXPORT_FILE_MAX_AGE = int(os.getenv('EXPORT_FILE_MAX_AGE', 3600))
+_last_export_cleanup = 0
+
+def cleanup_export_files():
+    """Delete expired export files from EXPORT_DIR"""
+    cutoff = time.time() - EXPORT_FILE_MAX_AGE
+    with os.scandir(EXPORT_DIR) as entries:
+        for entry in entries:
+            try:
+                if (entry.name.startswith('export_') and entry.is_file()
+                        and entry.stat().st_mtime < cutoff):
+                    os.remove(entry.path)
+            except OSError:
+                # Already removed by another worker
+                continue
+
+def schedule_export_cleanup():
+    """Run cleanup_export_files in the background, at most every few minutes"""
+    global _last_export_cleanup
+    now = time.time()
+    if now - _last_export_cleanup >= min(EXPORT_FILE_MAX_AGE, 300):
+        _last_export_cleanup = now
+        threading.Thread(target=cleanup_export_files, daemon=True).start()
+
+def build_pdf_export(export_data, filepath):
+    """Render export rows as a PDF table at filepath"""
+    # Ensure an Arabic-capable font is registered
+    arabic_font = register_arabic_font()
+
+    doc = SimpleDocTemplate(filepath, pagesize=letter)
+    styles = _PDF_STYLES
+    story = []
+    
+    # Add title (use default style; table cells use explicit font)
+    title = Paragraph("Shipping Data Export", styles['Title'])
+    story.append(title)
+    story.append(Spacer(1, 12))
+    
+    # Create table
+    if export_data:
+        # Get column names
+        columns = list(export_data[0].keys())
+        
+        # One paragraph style per row kind, shared by every cell
+        header_style = ParagraphStyle(
+            'CustomStyle',
+            fontName=arabic_font,
+            fontSize=10,
+            alignment=1,  # Center alignment
+            spaceAfter=6,
+            spaceBefore=6
+        )
+        body_style = ParagraphStyle(header_style.name, parent=header_style, fontSize=8)
+        
+        # Lay the rows out as a series of LongTables (header repeated on
+        # every page) rather than one Table: ReportLab re-splits the
+        # remaining rows of a table at every page break, and only one
+        # batch of intermediate cell lists is alive at a time
+        header_row = [build_pdf_cell(col, header_style) for col in columns]
+        table_style = get_pdf_table_style()
+        for start in range(0, len(export_data), PDF_EXPORT_BATCH_SIZE):
+            # Convert text data to Paragraph objects with Arabic-capable font
+            processed_table_data = [header_row]
+            processed_table_data.extend(
+                [build_pdf_cell(row.get(col, ''), body_style) for col in columns]
+                for row in export_data[start:start + PDF_EXPORT_BATCH_SIZE]
+            )
+            
+            story.append(LongTable(processed_table_data, repeatRows=1, style=table_style))
+    
+    doc.build(story)
+
+def record_pdf_export_failure(filepath, error):
+    """Mark a background PDF export as failed (filepath + '.error')"""
+    print(f"❌ PDF export failed for {os.path.basename(filepath)}: {error}")
+    with open(filepath + '.error', 'w', encoding='utf-8') as f:
+        f.write(str(error))
+    for path in (filepath + '.tmp', filepath + '.part'):
+        if os.path.exists(path):
+            os.remove(path)
+
+def run_pdf_export_job(export_data, filepath):
+    """Background PDF export (runs in a pdf_export_executor process)
+
+    filepath + '.part' holds the job's start time while it runs. The PDF is
+    built under filepath + '.tmp' and renamed into place when complete; a
+    failure leaves the error message in filepath + '.error'. Job state lives
+    on disk so any worker process can answer status polls.
+    """
+    try:
+        build_pdf_export(export_data, filepath + '.tmp')
+        os.replace(filepath + '.tmp', filepath)
+        os.remove(filepath + '.part')
+    except Exception as e:
+        record_pdf_export_failure(filepath, e)
+
+def submit_pdf_export_job(export_data, filepath):
+    """Start a background PDF export, replacing the process pool if a worker died"""
+    global pdf_export_executor
+    with open(filepath + '.part', 'w', encoding='utf-8') as f:
+        f.write(str(time.time()))
+    try:
+        future = pdf_export_executor.submit(run_pdf_export_job, export_data, filepath)
+    except BrokenProcessPool:
+        pdf_export_executor = create_pdf_export_executor()
+        future = pdf_export_executor.submit(run_pdf_export_job, export_data, filepath)
+    
+    def on_done(future):
+        # A killed pool process never gets to write its own .error marker
+        if future.exception() is not None and not os.path.exists(filepath + '.error'):
+            record_pdf_export_failure(filepath, future.exception())
+    future.add_done_callback(on_done)
+
 @app.route('/api/export', methods=['POST'])
 def export_data():
     """
@@ -1564,97 +2079,42 @@ def export_data():
         
         # Generate unique filename
         file_id = str(uuid.uuid4())
+        schedule_export_cleanup()
         
         if export_format == 'csv':
             # Create CSV file
             filename = f"export_{file_id}.csv"
-            filepath = os.path.join(tempfile.gettempdir(), filename)
+            filepath = os.path.join(EXPORT_DIR, filename)
             
-            df = pd.DataFrame(export_data)
-            df.to_csv(filepath, index=False, encoding='utf-8')
+            # Columns in first-seen order across all rows; missing values stay empty
+            fieldnames = list(dict.fromkeys(key for row in export_data for key in row))
+            with open(filepath, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator='\n')
+                writer.writeheader()
+                writer.writerows(export_data)
             
         elif export_format == 'pdf':
             # Create PDF file
             filename = f"export_{file_id}.pdf"
             
-            filepath = os.path.join(tempfile.gettempdir(), filename)
+            filepath = os.path.join(EXPORT_DIR, filename)
             
-            # Ensure an Arabic-capable font is registered
-            arabic_font = register_arabic_font()
-
-            doc = SimpleDocTemplate(filepath, pagesize=letter)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Add title (use default style; table cells use explicit font)
-            title = Paragraph("Shipping Data Export", styles['Title'])
-            story.append(title)
-            story.append(Spacer(1, 12))
-            
-            # Create table
-            if export_data:
-                # Get column names
-                columns = list(export_data[0].keys())
-                
-                # Prepare table data with proper Arabic text processing
-                table_data = [columns]  # Header
-                for row in export_data:
-                    row_data = []
-                    for col in columns:
-                        value = row.get(col, '')
-                        # Process Arabic text for proper display
-                        processed_value = process_arabic_text(value)
-                        row_data.append(processed_value)
-                    table_data.append(row_data)
-                
-                # Create table with better Arabic text support
-                # Convert text data to Paragraph objects with Arabic-capable font
-                processed_table_data = []
-                for row_idx, row in enumerate(table_data):
-                    processed_row = []
-                    for cell in row:
-                        if isinstance(cell, str) and cell.strip():
-                            # Use Paragraph for better text rendering
-                            try:
-                                # Create a simple paragraph style
-                                from reportlab.lib.styles import ParagraphStyle
-                                style = ParagraphStyle(
-                                    'CustomStyle',
-                                    fontName=arabic_font,
-                                    fontSize=8 if row_idx > 0 else 10,
-                                    alignment=1,  # Center alignment
-                                    spaceAfter=6,
-                                    spaceBefore=6
-                                )
-                                processed_cell = Paragraph(process_arabic_text(cell), style)
-                            except:
-                                processed_cell = process_arabic_text(cell)
-                        else:
-                            processed_cell = process_arabic_text(cell) if cell else ''
-                        processed_row.append(processed_cell)
-                    processed_table_data.append(processed_row)
-                
-                table = Table(processed_table_data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), globals().get('_ARABIC_FONT_BOLD_NAME') or arabic_font),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('FONTSIZE', (0, 1), (-1, -1), 8),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                    ('LEFTPADDING', (0, 0), (-1, -1), 6),
-                    ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-                    ('TOPPADDING', (0, 0), (-1, -1), 6),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
-                ]))
-                
-                story.append(table)
+            if len(export_data) > PDF_EXPORT_ASYNC_ROWS:
+                # Large exports render in the background; the client polls
+                # status_url until the file is ready
+                submit_pdf_export_job(export_data, filepath)
+                return jsonify({
+                    'success': True,
+                    'job_id': file_id,
+                    'status': 'running',
+                    'status_url': f'/api/export/status/{file_id}',
+                    'filename': filename,
+                    'download_url': f'/api/download/{filename}',
+                    'format': export_format,
+                    'record_count': len(export_data)
+                }), 202
             
-            doc.build(story)
+            build_pdf_export(export_data, filepath)
         
         # Return file download link
         return jsonify({
@@ -1668,15 +2128,131 @@ def export_data():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/export/status/<job_id>', methods=['GET'])
+def export_status(job_id):
+    """Report the state of a background PDF export"""
+    try:
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            return jsonify({'error': 'Export job not found'}), 404
+        
+        filename = f"export_{job_id}.pdf"
+        filepath = os.path.join(EXPORT_DIR, filename)
+        
+        if os.path.exists(filepath):
+            return jsonify({
+                'job_id': job_id,
+                'status': 'finished',
+                'filename': filename,
+                'download_url': f'/api/download/{filename}'
+            })
+        
+        if os.path.exists(filepath + '.error'):
+            with open(filepath + '.error', encoding='utf-8') as f:
+                error = f.read()
+            return jsonify({'job_id': job_id, 'status': 'failed', 'error': error})
+        
+        if os.path.exists(filepath + '.part'):
+            # A worker that crashed or was recycled leaves its marker behind
+            with open(filepath + '.part', encoding='utf-8') as f:
+                started = float(f.read() or 0)
+            if time.time() - started > PDF_EXPORT_TIMEOUT:
+                return jsonify({
+                    'job_id': job_id,
+                    'status': 'failed',
+                    'error': f'Export did not finish within {PDF_EXPORT_TIMEOUT} seconds'
+                })
+            return jsonify({'job_id': job_id, 'status': 'running'})
+        
+        return jsonify({'error': 'Export job not found'}), 404
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Columns written by /api/export/stream, in table order
+EXPORT_COLUMNS = [
+    'id', 'number_shipment', 'country_code',
+    'shipper_city', 'shipper_phone', 'shipper_name', 'shipper_address',
+    'consignee_city', 'consignee_phone', 'consignee_name', 'consignee_address',
+    'shipment_reference_number', 'shipment_creation_date', 'cod',
+    'shipment_weight', 'number_of_shipment_boxes', 'shipment_description',
+    'pdf_filename', 'processing_date', 'created_at',
+]
+
+@app.route('/api/export/stream', methods=['GET'])
+def stream_export():
+    """
+    Stream shipments as CSV produced by PostgreSQL COPY (constant memory)
+    Query params: date_filter, start_date, end_date, column + value (all optional)
+    """
+    try:
+        date_filter = request.args.get('date_filter')
+        start_date_param = request.args.get('start_date')
+        end_date_param = request.args.get('end_date')
+        column = request.args.get('column')
+        value = request.args.get('value')
+        
+        where_conditions = []
+        params = []
+        
+        if column and value:
+            if column not in FILTER_COLUMNS:
+                return jsonify({'error': f'Invalid column: {column}'}), 400
+            where_conditions.append(f"{column} ILIKE %s")
+            params.append(f'%{value}%')
+        
+        # Custom range takes priority over the preset
+        start_date, end_date = None, None
+        if start_date_param and end_date_param:
+            start_date = parse_date_param(start_date_param)
+            end_date = parse_date_param(end_date_param)
+        elif date_filter and date_filter != 'total':
+            start_date, end_date = parse_date_filter(date_filter)
+        if start_date and end_date:
+            where_conditions.append(f"{DATE_SQL} >= %s AND {DATE_SQL} <= %s")
+            params.extend([start_date, end_date])
+        
+        where_clause = ""
+        if where_conditions:
+            where_clause = " WHERE " + " AND ".join(where_conditions)
+        
+        query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM shipments{where_clause} ORDER BY id DESC"
+        
+        # Fetch the first chunk up front so query errors still get a JSON 500
+        chunks = db.iter_copy_csv(query, params)
+        first = next(chunks, b'')
+        
+        def generate():
+            # Closing this generator (client disconnect) closes chunks too
+            yield first
+            yield from chunks
+        
+        response = Response(generate(), mimetype='text/csv')
+        download_name = f"shipments_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/download/<filename>', methods=['GET'])
 def download_file(filename):
     """Download exported file"""
     try:
-        filepath = os.path.join(tempfile.gettempdir(), filename)
+        filepath = os.path.join(EXPORT_DIR, filename)
         
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 404
         
+        if app.config['USE_X_ACCEL']:
+            response = Response(
+                mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                headers={'X-Accel-Redirect': app.config['X_ACCEL_PREFIX'] + filename}
+            )
+            response.headers.set('Content-Disposition', 'attachment', filename=filename)
+            return response
+        
         return send_file(filepath, as_attachment=True)
         
     except Exception as e:
@@ -1758,7 +2334,7 @@ def create_custom_report():
             data['report_name'],
             data.get('description', ''),
             sql_query,
-            json.dumps(parameters),
+            to_jsonb(parameters),
             'default_user'
         ])
         
@@ -1805,7 +2381,7 @@ def update_custom_report(report_id):
             data['report_name'],
             data.get('description', ''),
             sql_query,
-            json.dumps(parameters),
+            to_jsonb(parameters),
             report_id
         ])
         
@@ -2293,8 +2869,8 @@ def create_scheduled_report():
             data['schedule_name'],
             data.get('schedule_type', 'daily'),
             data.get('schedule_time', '09:00:00'),
-            json.dumps(data.get('schedule_days', [])),
-            json.dumps(data.get('email_recipients', [])),
+            to_jsonb(data.get('schedule_days', [])),
+            to_jsonb(data.get('email_recipients', [])),
             data.get('email_subject', ''),
             data.get('email_body', ''),
             'default_user'
@@ -2330,8 +2906,8 @@ def update_scheduled_report(schedule_id):
             data['schedule_name'],
             data.get('schedule_type', 'daily'),
             data.get('schedule_time', '09:00:00'),
-            json.dumps(data.get('schedule_days', [])),
-            json.dumps(data.get('email_recipients', [])),
+            to_jsonb(data.get('schedule_days', [])),
+            to_jsonb(data.get('email_recipients', [])),
             data.get('email_subject', ''),
             data.get('email_body', ''),
             schedule_id
@@ -2383,11 +2959,14 @@ def toggle_scheduled_report(schedule_id):
 def get_saved_searches():
     """Get all saved searches"""
     try:
+        # Explicit columns: a prepared SELECT * fails with "cached plan must
+        # not change result type" after any ALTER TABLE saved_searches
         query = """
-        SELECT * FROM saved_searches 
+        SELECT id, title, description, filters, created_at, last_used_at, usage_count, user_id
+        FROM saved_searches 
         ORDER BY last_used_at DESC, created_at DESC
         """
-        searches = db.execute_query(query)
+        searches = db.execute_prepared(query)
         
         return jsonify({
             'success': True,
@@ -2415,9 +2994,9 @@ def save_search():
         result = db.execute_insert(query, [
             data['title'],
             data.get('description', ''),
-            json.dumps(data['filters']),
+            to_jsonb(data['filters']),
             'default_user'
-        ])
+        ], prepared=True)
         
         return jsonify({
             'success': True,
@@ -2446,9 +3025,9 @@ def update_saved_search(search_id):
         db.execute_insert(query, [
             data['title'],
             data.get('description', ''),
-            json.dumps(data['filters']),
+            to_jsonb(data['filters']),
             search_id
-        ])
+        ], prepared=True)
         
         return jsonify({
             'success': True,
@@ -2463,7 +3042,7 @@ def delete_saved_search(search_id):
     """Delete a saved search"""
     try:
         query = "DELETE FROM saved_searches WHERE id = %s"
-        db.execute_insert(query, [search_id])
+        db.execute_insert(query, [search_id], prepared=True)
         
         return jsonify({
             'success': True,
@@ -2483,7 +3062,7 @@ def update_search_usage(search_id):
         WHERE id = %s
         """
         
-        db.execute_insert(query, [search_id])
+        db.execute_insert(query, [search_id], prepared=True)
         
         return jsonify({
             'success': True,
@@ -2691,13 +3270,14 @@ def reorder_widgets():
         data = request.get_json()
         widgets = data['widgets']
         
-        for index, widget in enumerate(widgets):
-            query = """
-            UPDATE dashboard_widgets
-            SET position = %s
-            WHERE id = %s
-            """
-            db.execute_insert(query, [index, widget['id']])
+        # One UPDATE ... FROM (VALUES ...) for the whole layout, committed together
+        query = """
+        UPDATE dashboard_widgets
+        SET position = v.position
+        FROM (VALUES %s) AS v(position, id)
+        WHERE dashboard_widgets.id = v.id
+        """
+        db.execute_many(query, [(index, widget['id']) for index, widget in enumerate(widgets)])
         
         return jsonify({
             'success': True,
@@ -13,9 +13,18 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'smsa_shipments'),
     'user': os.getenv('DB_USER', 'smsa_user'),
     'password': os.getenv('DB_PASSWORD', 'Waseem050'),
-    'port': int(os.getenv('DB_PORT', 5432))
+    'port': int(os.getenv('DB_PORT', 5432)),
+    # TCP keepalives so idle pooled connections survive NAT/firewall timeouts
+    'keepalives': 1,
+    'keepalives_idle': int(os.getenv('DB_KEEPALIVES_IDLE', 30)),
+    'keepalives_interval': 10,
+    'keepalives_count': 5
 }
 
+# Connection pool sizing (per worker process)
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 4))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 32))
+
 def get_connection_string():
     """Get connection string for debugging"""
     return f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
@@ -36,6 +45,7 @@ if __name__ == "__main__":
     print(f"Database: {DB_CONFIG['database']}")
     print(f"User: {DB_CONFIG['user']}")
     print(f"Port: {DB_CONFIG['port']}")
+    print(f"Pool Size: {DB_POOL_MIN}-{DB_POOL_MAX}")
     print(f"Connection String: {get_connection_string()}")
     
     success, message = test_connection()
@@ -14,7 +14,6 @@ def check_dependencies():
     required_packages = [
         'flask',
         'flask_cors',
-        'pandas',
         'reportlab',
         'python-dateutil',
         'psycopg2'
@@ -50,8 +49,9 @@ def check_database():
         import psycopg2
         from database_config import DB_CONFIG
         
-        # Test database connection
+        # Test database connection (autocommit so the DDL below is persisted)
         conn = psycopg2.connect(**DB_CONFIG)
+        conn.autocommit = True
         cursor = conn.cursor()
         cursor.execute("SELECT 1")
         
@@ -67,6 +67,36 @@ def check_database():
         # Create dashboard_widgets table if it doesn't exist
         create_dashboard_widgets_table(cursor)
         
+        # Add the parsed creation date column used for date filtering/sorting
+        create_shipments_date_column(cursor)
+        
+        # Add the (date, id) index used for keyset pagination
+        create_shipments_seek_index(cursor)
+        
+        # Add the numeric weight column used by weight filters/averages
+        create_shipments_weight_column(cursor)
+        
+        # Add the numeric COD column used by the COD filters
+        create_shipments_cod_column(cursor)
+        
+        # Add trigram indexes for substring filters (needs pg_trgm)
+        create_shipments_trigram_indexes(cursor)
+        
+        # Add the full-text index used for description searches
+        create_shipments_description_fts_index(cursor)
+        
+        # Create the materialized view behind the all-time top customers
+        create_top_shippers_view(cursor)
+        
+        # Create the materialized view behind the top cities ranking
+        create_city_daily_counts_view(cursor)
+        
+        # Create the materialized view behind date-filtered top customers
+        create_shipper_daily_counts_view(cursor)
+        
+        # Create the materialized view behind unique consignees for date-filtered top customers
+        create_shipper_consignee_daily_counts_view(cursor)
+        
         cursor.close()
         conn.close()
         
@@ -84,23 +114,9 @@ def check_database():
 def create_saved_searches_table(cursor):
     """Create saved_searches table if it doesn't exist"""
     try:
-        # Check if table exists
+        # Create the table (no-op if it already exists)
         cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'saved_searches'
-            )
-        """)
-        table_exists = cursor.fetchone()[0]
-        
-        if table_exists:
-            print("✅ saved_searches table already exists")
-            return
-        
-        # Create the table
-        cursor.execute("""
-            CREATE TABLE saved_searches (
+            CREATE TABLE IF NOT EXISTS saved_searches (
                 id SERIAL PRIMARY KEY,
                 title VARCHAR(255) NOT NULL,
                 description TEXT,
@@ -112,7 +128,7 @@ def create_saved_searches_table(cursor):
             )
         """)
         
-        print("✅ saved_searches table created successfully")
+        print("✅ saved_searches table ready")
         
     except Exception as e:
         print(f"❌ Error creating saved_searches table: {e}")
@@ -121,23 +137,9 @@ def create_saved_searches_table(cursor):
 def create_custom_reports_table(cursor):
     """Create custom_reports table if it doesn't exist"""
     try:
-        # Check if table exists
+        # Create the table (no-op if it already exists)
         cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'custom_reports'
-            )
-        """)
-        table_exists = cursor.fetchone()[0]
-        
-        if table_exists:
-            print("✅ custom_reports table already exists")
-            return
-        
-        # Create the table
-        cursor.execute("""
-            CREATE TABLE custom_reports (
+            CREATE TABLE IF NOT EXISTS custom_reports (
                 id SERIAL PRIMARY KEY,
                 report_name VARCHAR(255) NOT NULL,
                 description TEXT,
@@ -151,7 +153,7 @@ def create_custom_reports_table(cursor):
             )
         """)
         
-        print("✅ custom_reports table created successfully")
+        print("✅ custom_reports table ready")
         
     except Exception as e:
         print(f"❌ Error creating custom_reports table: {e}")
@@ -160,23 +162,9 @@ def create_custom_reports_table(cursor):
 def create_scheduled_reports_table(cursor):
     """Create scheduled_reports table if it doesn't exist"""
     try:
-        # Check if table exists
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'scheduled_reports'
-            )
-        """)
-        table_exists = cursor.fetchone()[0]
-        
-        if table_exists:
-            print("✅ scheduled_reports table already exists")
-            return
-        
-        # Create the table
+        # Create the table (no-op if it already exists)
         cursor.execute("""
-            CREATE TABLE scheduled_reports (
+            CREATE TABLE IF NOT EXISTS scheduled_reports (
                 id SERIAL PRIMARY KEY,
                 report_id INTEGER REFERENCES custom_reports(id) ON DELETE CASCADE,
                 schedule_name VARCHAR(255) NOT NULL,
@@ -195,7 +183,7 @@ def create_scheduled_reports_table(cursor):
             )
         """)
         
-        print("✅ scheduled_reports table created successfully")
+        print("✅ scheduled_reports table ready")
         
     except Exception as e:
         print(f"❌ Error creating scheduled_reports table: {e}")
@@ -204,23 +192,9 @@ def create_scheduled_reports_table(cursor):
 def create_dashboard_widgets_table(cursor):
     """Create dashboard_widgets table if it doesn't exist"""
     try:
-        # Check if table exists
+        # Create the table (no-op if it already exists)
         cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'dashboard_widgets'
-            )
-        """)
-        table_exists = cursor.fetchone()[0]
-        
-        if table_exists:
-            print("✅ dashboard_widgets table already exists")
-            return
-        
-        # Create the table
-        cursor.execute("""
-            CREATE TABLE dashboard_widgets (
+            CREATE TABLE IF NOT EXISTS dashboard_widgets (
                 id SERIAL PRIMARY KEY,
                 widget_name VARCHAR(255) NOT NULL,
                 description TEXT,
@@ -238,14 +212,355 @@ def create_dashboard_widgets_table(cursor):
         """)
         
         # Add index for performance
-        cursor.execute("CREATE INDEX idx_widgets_position ON dashboard_widgets(position)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_widgets_position ON dashboard_widgets(position)")
         
-        print("✅ dashboard_widgets table created successfully")
+        print("✅ dashboard_widgets table ready")
         
     except Exception as e:
         print(f"❌ Error creating dashboard_widgets table: {e}")
         raise
 
+def create_shipments_date_column(cursor):
+    """Add shipments.shipment_creation_date_parsed (DATE) if it doesn't exist"""
+    try:
+        # Generated columns need an IMMUTABLE expression (to_date() is only STABLE),
+        # and unparseable values such as '31-Feb-25' must become NULL instead of failing
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION parse_shipment_creation_date(value TEXT)
+            RETURNS DATE AS $$
+            BEGIN
+                IF value ~ '^[0-9]{2}-[A-Za-z]{3}-[0-9]{2}$' THEN
+                    RETURN make_date(
+                        2000 + substring(value, 8, 2)::INTEGER,
+                        CASE substring(value, 4, 3)
+                            WHEN 'Jan' THEN 1 WHEN 'Feb' THEN 2 WHEN 'Mar' THEN 3
+                            WHEN 'Apr' THEN 4 WHEN 'May' THEN 5 WHEN 'Jun' THEN 6
+                            WHEN 'Jul' THEN 7 WHEN 'Aug' THEN 8 WHEN 'Sep' THEN 9
+                            WHEN 'Oct' THEN 10 WHEN 'Nov' THEN 11 WHEN 'Dec' THEN 12
+                        END,
+                        substring(value, 1, 2)::INTEGER
+                    );
+                ELSIF value ~ '^[0-9]{8}$' THEN
+                    RETURN make_date(
+                        substring(value, 1, 4)::INTEGER,
+                        substring(value, 5, 2)::INTEGER,
+                        substring(value, 7, 2)::INTEGER
+                    );
+                ELSIF value ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}$' THEN
+                    RETURN make_date(
+                        substring(value, 1, 4)::INTEGER,
+                        substring(value, 6, 2)::INTEGER,
+                        substring(value, 9, 2)::INTEGER
+                    );
+                END IF;
+                RETURN NULL;
+            EXCEPTION WHEN others THEN
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql IMMUTABLE
+        """)
+        
+        # Create the column (no-op if it already exists); computed once per row
+        # on write instead of on every query, indexed by create_shipments_seek_index
+        cursor.execute("""
+            ALTER TABLE shipments
+            ADD COLUMN IF NOT EXISTS shipment_creation_date_parsed DATE
+            GENERATED ALWAYS AS (parse_shipment_creation_date(shipment_creation_date)) STORED
+        """)
+        
+        print("✅ shipments.shipment_creation_date_parsed column ready")
+        
+    except Exception as e:
+        print(f"❌ Error creating shipments.shipment_creation_date_parsed column: {e}")
+        raise
+
+def create_shipments_seek_index(cursor):
+    """Add the (shipment_creation_date_parsed, id) index used for keyset pagination"""
+    try:
+        # Matches ORDER BY shipment_creation_date_parsed DESC NULLS LAST, id DESC
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_shipments_creation_date_parsed_id
+            ON shipments (shipment_creation_date_parsed DESC NULLS LAST, id DESC)
+        """)
+        
+        # The single-column date index is a prefix of this one
+        cursor.execute("DROP INDEX IF EXISTS idx_shipments_creation_date_parsed")
+        
+        print("✅ idx_shipments_creation_date_parsed_id index ready")
+        
+    except Exception as e:
+        print(f"❌ Error creating idx_shipments_creation_date_parsed_id index: {e}")
+        raise
+
+def create_shipments_weight_column(cursor):
+    """Add shipments.shipment_weight_num (NUMERIC) and its index if they don't exist"""
+    try:
+        # Same cleanup as the old per-query regex cascade ('0.50 Kg' -> 0.50);
+        # values that still aren't numeric (e.g. '1.2.3') become NULL
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION parse_shipment_numeric(value TEXT)
+            RETURNS NUMERIC AS $$
+            BEGIN
+                RETURN NULLIF(
+                    regexp_replace(
+                        regexp_replace(
+                            regexp_replace(trim(value), '[^0-9.]', '', 'g'),
+                            '^[.]', '0.'
+                        ),
+                        '[.]$', ''
+                    ),
+                    ''
+                )::NUMERIC;
+            EXCEPTION WHEN others THEN
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql IMMUTABLE
+        """)
+        
+        # Create the column (no-op if it already exists)
+        cursor.execute("""
+            ALTER TABLE shipments
+            ADD COLUMN IF NOT EXISTS shipment_weight_num NUMERIC
+            GENERATED ALWAYS AS (parse_shipment_numeric(shipment_weight)) STORED
+        """)
+        
+        # Add index for weight filters
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_shipments_weight_num
+            ON shipments (shipment_weight_num)
+            WHERE shipment_weight_num IS NOT NULL
+        """)
+        
+        print("✅ shipments.shipment_weight_num column ready")
+        
+    except Exception as e:
+        print(f"❌ Error creating shipments.shipment_weight_num column: {e}")
+        raise
+
+def create_shipments_cod_column(cursor):
+    """Add shipments.cod_num (NUMERIC) if it doesn't exist"""
+    try:
+        # parse_shipment_numeric() is created with shipment_weight_num
+        # (create_shipments_weight_column runs first)
+        cursor.execute("""
+            ALTER TABLE shipments
+            ADD COLUMN IF NOT EXISTS cod_num NUMERIC
+            GENERATED ALWAYS AS (parse_shipment_numeric(cod)) STORED
+        """)
+        
+        print("✅ shipments.cod_num column ready")
+        
+    except Exception as e:
+        print(f"❌ Error creating shipments.cod_num column: {e}")
+        raise
+
+# Text columns searched with ILIKE '%value%' (filter, advanced search, by-shipper/consignee)
+TRIGRAM_INDEX_COLUMNS = [
+    'number_shipment',
+    'shipment_reference_number',
+    'shipper_name',
+    'shipper_city',
+    'shipper_phone',
+    'shipper_address',
+    'consignee_name',
+    'consignee_city',
+    'consignee_phone',
+    'consignee_address',
+    'pdf_filename',
+]
+
+def create_shipments_trigram_indexes(cursor):
+    """Add pg_trgm GIN indexes so leading-wildcard LIKE/ILIKE filters can use an index"""
+    try:
+        # pg_trgm ships in postgresql-contrib, which may not be installed
+        cursor.execute("""
+            SELECT EXISTS (
+                SELECT FROM pg_available_extensions 
+                WHERE name = 'pg_trgm'
+            )
+        """)
+        extension_available = cursor.fetchone()[0]
+        
+        if not extension_available:
+            print("⚠️  pg_trgm extension not available, skipping trigram indexes")
+            return
+        
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        
+        for column in TRIGRAM_INDEX_COLUMNS:
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_shipments_{column}_trgm
+                ON shipments USING gin ({column} gin_trgm_ops)
+            """)
+        
+        print(f"✅ Trigram indexes ready on {len(TRIGRAM_INDEX_COLUMNS)} shipments columns")
+        
+    except Exception as e:
+        print(f"❌ Error creating trigram indexes: {e}")
+        raise
+
+def create_shipments_description_fts_index(cursor):
+    """Add a GIN full-text index on shipment_description if it doesn't exist"""
+    try:
+        # Expression must match the to_tsvector() call in app._text_filter
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_shipments_description_fts
+            ON shipments USING gin (to_tsvector('simple', shipment_description))
+        """)
+        
+        print("✅ idx_shipments_description_fts index ready")
+        
+    except Exception as e:
+        print(f"❌ Error creating idx_shipments_description_fts index: {e}")
+        raise
+
+def create_top_shippers_view(cursor):
+    """Create the mv_top_shippers materialized view and its indexes if they don't exist"""
+    try:
+        cursor.execute("""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS mv_top_shippers AS
+            SELECT 
+                shipper_name,
+                MIN(shipper_phone) as shipper_phone,
+                COUNT(*) as shipment_count,
+                COUNT(DISTINCT consignee_name) as unique_consignees
+            FROM shipments
+            WHERE shipper_name IS NOT NULL 
+            AND shipper_name != ''
+            GROUP BY shipper_name
+        """)
+        
+        # The unique index is required for REFRESH ... CONCURRENTLY
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_top_shippers_shipper_name
+            ON mv_top_shippers (shipper_name)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_mv_top_shippers_shipment_count
+            ON mv_top_shippers (shipment_count DESC)
+        """)
+        
+        print("✅ mv_top_shippers view ready")
+        
+    except Exception as e:
+        print(f"❌ Error creating mv_top_shippers view: {e}")
+        raise
+
+def create_city_daily_counts_view(cursor):
+    """Create the mv_city_daily_counts materialized view and its indexes if they don't exist"""
+    try:
+        # Per-day counts sum to any date range (and to the all-time ranking)
+        cursor.execute("""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS mv_city_daily_counts AS
+            SELECT 
+                shipment_creation_date_parsed as shipment_date,
+                consignee_city as city,
+                COUNT(*) as shipment_count
+            FROM shipments
+            WHERE consignee_city IS NOT NULL 
+            AND consignee_city != ''
+            AND consignee_city != 'NULL'
+            GROUP BY shipment_creation_date_parsed, consignee_city
+        """)
+        
+        # The unique index is required for REFRESH ... CONCURRENTLY
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_city_daily_counts_date_city
+            ON mv_city_daily_counts (shipment_date, city)
+        """)
+        
+        print("✅ mv_city_daily_counts view ready")
+        
+    except Exception as e:
+        print(f"❌ Error creating mv_city_daily_counts view: {e}")
+        raise
+
+def create_shipper_daily_counts_view(cursor):
+    """Create the mv_shipper_daily_counts materialized view and its indexes if they don't exist"""
+    try:
+        # One row per shipper per day; date ranges sum these
+        cursor.execute("""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS mv_shipper_daily_counts AS
+            SELECT 
+                shipment_creation_date_parsed as shipment_date,
+                shipper_name,
+                MIN(shipper_phone) as shipper_phone,
+                COUNT(*) as shipment_count
+            FROM shipments
+            WHERE shipper_name IS NOT NULL 
+            AND shipper_name != ''
+            AND shipment_creation_date_parsed IS NOT NULL
+            GROUP BY shipment_creation_date_parsed, shipper_name
+        """)
+        
+        # The unique index is required for REFRESH ... CONCURRENTLY
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_shipper_daily_counts_date_shipper
+            ON mv_shipper_daily_counts (shipment_date, shipper_name)
+        """)
+        
+        print("✅ mv_shipper_daily_counts view ready")
+        
+    except Exception as e:
+        print(f"❌ Error creating mv_shipper_daily_counts view: {e}")
+        raise
+
+def create_shipper_consignee_daily_counts_view(cursor):
+    """Create the mv_shipper_consignee_daily_counts materialized view and its index if they don't exist"""
+    try:
+        # Distinct consignees don't sum across days, so unique_consignees for
+        # a date range is counted from the (shipper, day, consignee) rows of
+        # the top shippers only
+        cursor.execute("""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS mv_shipper_consignee_daily_counts AS
+            SELECT 
+                shipper_name,
+                shipment_creation_date_parsed as shipment_date,
+                consignee_name,
+                COUNT(*) as shipment_count
+            FROM shipments
+            WHERE shipper_name IS NOT NULL 
+            AND shipper_name != ''
+            AND shipment_creation_date_parsed IS NOT NULL
+            GROUP BY shipper_name, shipment_creation_date_parsed, consignee_name
+        """)
+        
+        # Unique for REFRESH ... CONCURRENTLY; shipper first for per-shipper lookups
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_shipper_consignee_daily_counts_shipper_date_consignee
+            ON mv_shipper_consignee_daily_counts (shipper_name, shipment_date, consignee_name)
+        """)
+        
+        print("✅ mv_shipper_consignee_daily_counts view ready")
+        
+    except Exception as e:
+        print(f"❌ Error creating mv_shipper_consignee_daily_counts view: {e}")
+        raise
+
+def refresh_views():
+    """Refresh the materialized views (run periodically, e.g. hourly from cron)"""
+    try:
+        import psycopg2
+        from database_config import DB_CONFIG
+        
+        conn = psycopg2.connect(**DB_CONFIG)
+        conn.autocommit = True
+        cursor = conn.cursor()
+        
+        # CONCURRENTLY keeps the view readable while it is rebuilt
+        for view in ('mv_top_shippers', 'mv_city_daily_counts', 'mv_shipper_daily_counts',
+                     'mv_shipper_consignee_daily_counts'):
+            cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+            print(f"✅ {view} view refreshed")
+        
+        cursor.close()
+        conn.close()
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error refreshing materialized views: {e}")
+        return False
+
 def start_api():
     """Start the API server"""
     print("=" * 60)
@@ -275,4 +590,6 @@ def start_api():
         print(f"\n❌ Error starting API server: {e}")
 
 if __name__ == "__main__":
+    if '--refresh-views' in sys.argv:
+        sys.exit(0 if refresh_views() else 1)
     start_api()
@@ -8,12 +8,13 @@ Test all endpoints of the Shipping Data API
 import requests
 import json
 import time
+import uuid
 
 # API base URL
 BASE_URL = "http://localhost:5000/api"
 
-def test_endpoint(method, endpoint, params=None, data=None):
-    """Test a single API endpoint"""
+def test_endpoint(method, endpoint, params=None, data=None, expected_status=200):
+    """Test a single API endpoint and return its response"""
     url = f"{BASE_URL}{endpoint}"
     
     try:
@@ -25,15 +26,19 @@ def test_endpoint(method, endpoint, params=None, data=None):
         print(f"\n{method.upper()} {endpoint}")
         print(f"Status: {response.status_code}")
         
-        if response.status_code == 200:
+        if response.status_code != expected_status:
+            print(f"❌ Error: {response.text}")
+        elif response.headers.get('Content-Type', '').startswith('text/csv'):
+            print(f"CSV lines returned: {len(response.text.splitlines())}")
+            print("✅ Success")
+        else:
             result = response.json()
             if 'data' in result:
                 print(f"Records returned: {len(result['data'])}")
-            if 'pagination' in result:
+            if 'total' in result.get('pagination', {}):
                 print(f"Total records: {result['pagination']['total']}")
             print("✅ Success")
-        else:
-            print(f"❌ Error: {response.text}")
+        return response
             
     except requests.exceptions.ConnectionError:
         print(f"❌ Connection Error: Make sure the API server is running on {BASE_URL}")
@@ -97,6 +102,18 @@ def main():
     ]
     test_endpoint("POST", "/export", data={"format": "csv", "data": sample_data})
     
+    # Test 15: Streamed CSV export
+    test_endpoint("GET", "/export/stream", {"column": "shipper_city", "value": "Dubai"})
+    
+    # Test 16: Export status for an unknown job
+    test_endpoint("GET", f"/export/status/{uuid.uuid4()}", expected_status=404)
+    
+    # Test 17: Follow one next_cursor page
+    response = test_endpoint("GET", "/shipments", {"cursor": "", "limit": 5})
+    if response is not None and response.ok and response.json()['pagination']['next_cursor']:
+        next_cursor = response.json()['pagination']['next_cursor']
+        test_endpoint("GET", "/shipments", {"cursor": next_cursor, "limit": 5})
+    
     print("\n" + "=" * 60)
     print("API TEST COMPLETED")
     print("=" * 60)
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WSGI Entry Point
+Production entry point for serving the API with gunicorn gevent workers:
+
+    gunicorn -k gevent -w 4 --worker-connections 500 wsgi:app
+
+gevent must patch the standard library and psycopg2 before the app (and
+its connection pool) is imported, so that waiting on PostgreSQL yields to
+other in-flight requests instead of blocking the worker.
+"""
+
+from gevent import monkey
+monkey.patch_all()
+
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+from app import app  # noqa: E402
+
+if __name__ == "__main__":
+    app.run(host='0.0.0.0', port=5000)